@@ -0,0 +1,139 @@
+#!/usr/bin/env python
+"""
+Module disposes of the benchmark harness. Times each stage of the pipeline
+separately on a project, by default a synthetic one, and saves or compares
+the timings against a JSON baseline. A comparison run exits with status 1
+when any stage regressed beyond the tolerance.
+"""
+from argparse import ArgumentParser
+from contextlib import contextmanager
+from pathlib import Path
+import json, platform, shutil, sys, tempfile, time
+
+sys.path.insert(0, str(Path(__file__).parent / '..' / 'unscheduler'))
+from aux import ProjectInfo, read_texts, Charlie
+from factory import Parser, BuildingFactory, SubplotFactory, SiteFactory
+from factory import building_schema, subplots_schema, perm_schema, site_schema
+from project import write_tables
+from building import StoryIndex
+from land import Lot
+from generate import generate
+
+stages = ['read_texts', 'parser', 'building_factory', 'subplot_factory', 'lot', 'formatting', 'compile']
+
+class Timer:
+    """
+    Keeps the best wall time of each stage over several repetitions
+    """
+    def __init__(self):
+        self.best = {}
+
+    def __repr__(self):
+        s = '{}: best={};'
+        return s.format(self.__class__, self.best)
+
+    @contextmanager
+    def __call__(self, stage):
+        start = time.perf_counter()
+        yield
+        elapsed = time.perf_counter() - start
+        self.best[stage] = min(elapsed, self.best.get(stage, elapsed))
+
+
+def run_stages(root, timer, compile=True, jobs=None):
+    """Run the pipeline on the project at root once, timing each stage with timer"""
+    info = ProjectInfo(root / 'config.ini')
+    names = info.schedule_files()
+    with timer('read_texts'):
+        texts = read_texts(root / 'publisher' / 'schedules', names)
+        texts = {name : texts[name] for name in names}
+
+    schemas = dict.fromkeys(names, building_schema)
+    schemas.update({'subplots.txt': subplots_schema, 'area_perm.txt': perm_schema, 'topografico.txt': site_schema})
+    with timer('parser'):
+        for name in names:
+            Parser.parse(texts[name], schemas[name])
+
+    with timer('building_factory'):
+        buildings = [BuildingFactory.get_building(model, texts[f'{model}.txt']) for model in info.misc.files]
+        buildings.append(BuildingFactory.get_null_building())
+
+    with timer('subplot_factory'):
+        index = StoryIndex(buildings, info.levels)
+        info.build_relations(buildings, texts.get(info.relations_file))
+        subplots = SubplotFactory.get_subplots(texts['subplots.txt'], texts['area_perm.txt'], info.relations, index)
+
+    with timer('lot'):
+        site = SiteFactory(texts['topografico.txt'], info)
+        lot = Lot.from_lands(0, 'lote', subplots, story_index=index, **info.misc._asdict())
+        for land in [lot, *subplots]:
+            land.coef_aprov, land.taxa_perm, land.taxa_ocp
+
+    with tempfile.TemporaryDirectory() as out:
+        out = Path(out)
+        with timer('formatting'):
+            write_tables(site, lot, buildings, out)
+        if compile:
+            with timer('compile'):
+                Charlie.do(out, out, jobs)
+
+def compare(current, baseline, tolerance, min_delta):
+    """Return list of (stage, baseline, current) for the stages of baseline that
+    got slower than baseline * (1 + tolerance) by more than min_delta seconds"""
+    regressions = []
+    for stage, before in baseline['stages'].items():
+        after = current['stages'].get(stage)
+        if after is not None and after > before * (1 + tolerance) and after - before > min_delta:
+            regressions.append((stage, before, after))
+    return regressions
+
+def parse_arguments(argv=None):
+    parser = ArgumentParser(description='Time each stage of the pipeline')
+    parser.add_argument('--project', type=Path,
+                        help='Project to benchmark, a synthetic one is generated if not given')
+    parser.add_argument('--subplots', type=int, default=2000, help='Subplots of the synthetic project')
+    parser.add_argument('--models', type=int, default=200, help='Building models of the synthetic project')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--repeat', type=int, default=5, help='Repetitions, the best time of each stage is kept')
+    parser.add_argument('--no-compile', action='store_true', help='Skip the compile stage')
+    parser.add_argument('-j', '--jobs', type=int, help='pdflatex processes for the compile stage')
+    parser.add_argument('--save', type=Path, help='Save the timings as a JSON baseline')
+    parser.add_argument('--compare', type=Path, help='Compare the timings against a JSON baseline')
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help='Allowed slowdown relative to the baseline, 0.25 is 25%%')
+    parser.add_argument('--min-delta', type=float, default=0.002,
+                        help='Slowdowns under this many seconds are never regressions')
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_arguments(argv)
+    compile = not args.no_compile and shutil.which(Charlie.engine) is not None
+    timer = Timer()
+    with tempfile.TemporaryDirectory() as tmp:
+        root = args.project or generate(Path(tmp) / 'project', args.subplots, args.models, args.seed)
+        for _ in range(args.repeat):
+            run_stages(root, timer, compile, args.jobs)
+    params = dict(project=str(args.project) if args.project else None, repeat=args.repeat)
+    if not args.project:
+        params.update(subplots=args.subplots, models=args.models, seed=args.seed)
+    result = dict(python=platform.python_version(), machine=platform.machine(), params=params,
+                  stages={stage : round(timer.best[stage], 6) for stage in stages if stage in timer.best})
+    for stage, seconds in result['stages'].items():
+        print('{:<18} {:>10.4f}s'.format(stage, seconds))
+    if not compile:
+        print('{:<18} {:>11}'.format('compile', 'skipped'))
+    if args.save:
+        args.save.write_text(json.dumps(result, indent=2) + '\n')
+    if args.compare:
+        baseline = json.loads(args.compare.read_text())
+        if baseline['params'] != params:
+            print('Warning: baseline was recorded with {}'.format(baseline['params']))
+        regressions = compare(result, baseline, args.tolerance, args.min_delta)
+        for stage, before, after in regressions:
+            print('REGRESSION {:<18} {:.4f}s -> {:.4f}s ({:+.0%})'.format(stage, before, after, after / before - 1))
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
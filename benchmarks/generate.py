@@ -0,0 +1,87 @@
+#!/usr/bin/env python
+"""
+Module disposes of a generator of synthetic projects, laid out and encoded
+like the schedules Archicad exports, for benchmarking the pipeline on
+projects much larger than the sample.
+"""
+from argparse import ArgumentParser
+from pathlib import Path
+import random
+
+stories = ['TERREO PAV', 'SEGUNDO PAVIMENTO', 'TERCEIRO PAVIMENTO', 'QUARTO PAVIMENTO', 'ATICO']
+
+config_template = """[topografico]
+area_ri = {area_ri}
+quadricula = 120
+ind_fiscal = 021
+
+[projeto]
+titulo = BENCHMARK {subplots}x{models}
+proprietario = BENCHMARK
+data_inicio = 05/19
+
+[misc]
+arquivos = {files}
+sublotes_rec = {rec}
+rec_cob = 44.0 40.0
+rec_desc = 43.0 51.0
+unidades = {units}
+ca = 50
+
+[relations]
+{relations}
+"""
+
+def area(x):
+    """Format x as Archicad does, thousands grouped by a no-break space"""
+    return '{:,.2f}'.format(x).replace(',', '\xa0')
+
+def schedule(header, rows):
+    """Return bytes of a schedule with header and rows, latin-1 encoded with
+    the trailing tab and CRLF line endings Archicad writes"""
+    lines = [header] + ['\t'.join(map(str, row)) for row in rows]
+    return ''.join(line + '\t\r\n' for line in lines).encode('latin-1')
+
+def generate(root, subplots=2000, models=200, seed=0):
+    """Write a project with subplots subplots and models building schedules to root.
+    Subplot 0 is the common area, the last two are recreation subplots, every other
+    subplot is related to a building model. Return root as a Path"""
+    rng = random.Random(seed)
+    root = Path(root)
+    schedules = root / 'publisher' / 'schedules'
+    schedules.mkdir(parents=True, exist_ok=True)
+    names = ['b{:04d}'.format(i) for i in range(models)]
+    for name in names:
+        rows = []
+        for story in stories[:rng.randint(1, len(stories))]:
+            rows.append((story, 'C', area(rng.uniform(30, 120))))
+            if rng.random() < 0.5:
+                rows.append((story, 'NC', area(rng.uniform(5, 40))))
+        (schedules / f'{name}.txt').write_bytes(schedule('Home Story\tZone Category Code\tMeasured Area', rows))
+
+    areas = [rng.uniform(120, 400) for _ in range(subplots)]
+    areas[0] = sum(areas) * 0.1
+    kinds = ['AREA COMUM'] + ['RESIDENCIA'] * (subplots - 3) + ['RECREACAO'] * 2
+    rows = [(i, kind, area(a)) for i, (kind, a) in enumerate(zip(kinds, areas))]
+    (schedules / 'subplots.txt').write_bytes(schedule('Zone Number\tZone Name\tMeasured Area', rows))
+    rows = [(i, area(a * rng.uniform(0.3, 0.6))) for i, a in enumerate(areas) if i]
+    (schedules / 'area_perm.txt').write_bytes(schedule('Zone Number\tMeasured Area', rows))
+    rows = [(0, area(sum(areas) * 1.05)), (1, area(sum(areas) * 0.05))]
+    (schedules / 'topografico.txt').write_bytes(schedule('Zone Number\tMeasured Area', rows))
+
+    rec = [subplots - 2, subplots - 1]
+    relations = ['0 = null'] + ['{} = {}'.format(i, rng.choice(names)) for i in range(1, subplots)]
+    (root / 'config.ini').write_text(config_template.format(
+        area_ri=10, subplots=subplots, models=models, files=' '.join(names),
+        rec=' '.join(map(str, rec)), units=subplots - 3, relations='\n'.join(relations)))
+    return root
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description='Generate a synthetic project')
+    parser.add_argument('root', type=Path, help='Directory of the generated project')
+    parser.add_argument('--subplots', type=int, default=2000)
+    parser.add_argument('--models', type=int, default=200)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    generate(args.root, args.subplots, args.models, args.seed)
@@ -0,0 +1,41 @@
+#!/usr/bin/env python
+"""
+Tests for batch mode
+"""
+from unittest import TestCase, main
+from argparse import Namespace
+from pathlib import Path
+import io, json, tempfile
+from batch import read_manifest, run_project, write_summary
+
+class TestBatch(TestCase):
+    """
+    Test manifests and per project summaries
+    """
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = Path(self.tmp.name)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_read_manifest(self):
+        manifest = self.path / 'manifest.txt'
+        manifest.write_text('# nightly\nproj-a\n\n  /abs/proj-b  \n')
+        self.assertEqual(read_manifest(manifest), [self.path / 'proj-a', Path('/abs/proj-b')])
+
+    def test_run_project_error(self):
+        """Errors are reported in the summary instead of raised"""
+        args = Namespace(jobs=1, no_cache=True, trace=None, profile=None, use_async=False)
+        result = run_project(self.path / 'missing', args)
+        self.assertEqual(result['status'], 'error')
+        self.assertIn('FileNotFoundError', result['error'])
+        summary = self.path / 'summary.json'
+        out = io.StringIO()
+        write_summary([result], out, summary)
+        self.assertIn('missing', out.getvalue())
+        self.assertEqual(json.loads(summary.read_text())[0]['status'], 'error')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,42 @@
+#!/usr/bin/env python
+"""
+Tests for the synthetic project generator and the benchmark comparison
+"""
+from unittest import TestCase, main
+from pathlib import Path
+import sys, tempfile
+sys.path.insert(0, str(Path(__file__).parent / '..' / 'benchmarks'))
+from generate import generate
+from bench import Timer, run_stages, compare
+from project import Project
+
+class TestBenchmarks(TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.root = generate(Path(self.tmp.name) / 'project', subplots=50, models=7)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_generate(self):
+        """Generated project loads like a real one"""
+        project = Project(self.root).load()
+        self.assertEqual(len(project.buildings), 8)
+        self.assertEqual(len(project.lot.lands), 50)
+        self.assertGreater(project.lot.area, 0)
+
+    def test_stages(self):
+        timer = Timer()
+        run_stages(self.root, timer, compile=False)
+        self.assertEqual(sorted(timer.best), ['building_factory', 'formatting', 'lot',
+                                              'parser', 'read_texts', 'subplot_factory'])
+
+    def test_compare(self):
+        baseline = dict(stages=dict(parser=0.1, lot=0.1, compile=1.0))
+        current = dict(stages=dict(parser=0.2, lot=0.101))
+        self.assertEqual(compare(current, baseline, 0.25, 0.002), [('parser', 0.1, 0.2)])
+        self.assertEqual(compare(current, baseline, 1.5, 0.002), [])
+
+
+if __name__ == '__main__':
+    main()
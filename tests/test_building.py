@@ -1,5 +1,5 @@
-import unittest
-from building import Building, Story
+import sys, unittest
+from building import Building, Story, StoryIndex, normalize
 
 class TestStory(unittest.TestCase):
 
@@ -11,6 +11,13 @@ class TestStory(unittest.TestCase):
         self.assertEqual(story.area_ncomp, 10)
         with self.assertRaises(ValueError):
             story.add_area(10, 'whatever')
+
+    def test_memory(self):
+        """Stories stay within their documented budget and share interned names"""
+        story = Story(1, ''.join(['pavimento ', 'terreo']))
+        self.assertLessEqual(sys.getsizeof(story), 64)
+        self.assertFalse(hasattr(story, '__dict__'))
+        self.assertIs(story.name, Story(2, ''.join(['pavimento ', 'terreo'])).name)
         
 
 class TestBuilding(unittest.TestCase):
@@ -28,6 +35,10 @@ class TestBuilding(unittest.TestCase):
         self.assertEqual(self.building[0], self.s1)
         self.assertEqual(self.building[1], self.s2)
 
+    def test_memory(self):
+        self.assertLessEqual(sys.getsizeof(self.building), 96)
+        self.assertFalse(hasattr(self.building, '__dict__'))
+
     def test_super_building(self):
         b1 = Building('b1', [self.s1])
         b2 = Building('b2', [self.s2])
@@ -36,6 +47,77 @@ class TestBuilding(unittest.TestCase):
         self.assertEqual(sup.area_comp, 4)
         self.assertEqual(sup.area_ncomp, 6)
         self.assertEqual(sup.area_proj, 4)
+
+    def test_super_building_padding(self):
+        """Stories missing from shorter buildings count as zero"""
+        b1 = Building('b1', [Story(0, 'terreo', 1, 2), Story(1, 'sup', 3, 4)])
+        b2 = Building('b2', [Story(0, 'terreo', 5, 6)])
+        sup = Building.get_super_building('super', [b2, b1])
+        self.assertEqual([story.name for story in sup.stories], ['terreo', 'sup'])
+        self.assertEqual(sup.areas_comp, (6, 3))
+        self.assertEqual(sup.areas_ncomp, (8, 4))
+        self.assertEqual(sup.area_proj, 8)
+        self.assertEqual(sup[5].name, 'out-of-range')
+
+    def test_shared_super_building(self):
+        """Same members and index give the same object, different members don't"""
+        b1 = Building('b1', [self.s1])
+        b2 = Building('b2', [self.s2])
+        index = StoryIndex([b1, b2])
+        sup = Building.get_shared_super_building([b1, b2], index)
+        self.assertIs(Building.get_shared_super_building((b1, b2), index), sup)
+        self.assertIsNot(Building.get_shared_super_building([b1], index), sup)
+        self.assertEqual(sup.model, 'super')
+        self.assertEqual(sup.area_comp, 4)
+        null = Building.get_null_building()
+        self.assertEqual(Building.get_shared_super_building([null, null]).model, 'null')
+
+    def test_shared_frozen(self):
+        """Stories of shared super buildings can't be modified, those of members can"""
+        b1 = Building('b1', [Story(0, 'terreo', 1, 2)])
+        sup = Building.get_shared_super_building([b1])
+        for story in sup.all_stories():
+            with self.assertRaises(AttributeError):
+                story.area_comp = 10
+            with self.assertRaises(AttributeError):
+                story.add_area(10, 'C')
+        self.assertEqual(sup.area_comp, 1)
+        self.assertEqual(sup.stories[0].name, 'terreo')
+        b1.stories[0].add_area(1, 'C')
+        self.assertEqual(b1.stories[0].area_comp, 2)
+
+    def test_super_building_by_name(self):
+        """Stories are joined by normalized name whatever their position"""
+        b1 = Building('b1', [Story(0, 'TERREO PAV', 1, 2), Story(1, 'SUPERIOR', 3, 4)])
+        b2 = Building('b2', [Story(0, 'superior', 5, 6), Story(1, 'terreo  pav', 7, 8)])
+        b3 = Building('b3', [Story(0, 'ATICO', 9, 0)])
+        sup = Building.get_super_building('super', [b1, b2, b3, Building.get_null_building()])
+        self.assertEqual([story.name for story in sup.stories], ['TERREO PAV', 'SUPERIOR', 'ATICO'])
+        self.assertEqual(sup.areas_comp, (8, 8, 9))
+        self.assertEqual(sup.areas_ncomp, (10, 10, 0))
+
+    def test_story_index(self):
+        """Levels come first, in the given order, then the remaining stories"""
+        b1 = Building('b1', [Story(0, 'TERREO', 1, 0), Story(1, 'SUPERIOR', 2, 0)])
+        b2 = Building('b2', [Story(0, 'MEZANINO', 3, 0), Story(1, 'TERREO', 4, 0)])
+        index = StoryIndex([b1, b2], ['Superior', 'terreo'])
+        self.assertEqual(index.names, ['Superior', 'terreo', 'MEZANINO'])
+        self.assertEqual(index.slot('  TERREO '), 1)
+        sup = Building.get_super_building('super', [b2, b1], index)
+        self.assertEqual([story.name for story in sup.stories], ['Superior', 'terreo', 'MEZANINO'])
+        self.assertEqual(sup.areas_comp, (2, 5, 3))
+        self.assertEqual(normalize(' terreo\tpav '), 'TERREO PAV')
+
+    def test_shared_story_index(self):
+        """The memo lives in the story index, nothing is kept without one"""
+        b1 = Building('b1', [Story(0, 'TERREO', 1, 0), Story(1, 'SUPERIOR', 2, 0)])
+        index = StoryIndex([b1])
+        sup = Building.get_shared_super_building([b1], index)
+        other = Building.get_shared_super_building([b1], StoryIndex([b1], ['SUPERIOR']))
+        self.assertIsNot(other, sup)
+        self.assertEqual(other.areas_comp, (2, 1))
+        self.assertEqual(list(index.super_buildings.values()), [sup])
+        self.assertIsNot(Building.get_shared_super_building([b1]), Building.get_shared_super_building([b1]))
         
         
 if __name__ == '__main__':
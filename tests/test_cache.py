@@ -0,0 +1,87 @@
+#!/usr/bin/env python
+"""
+Tests for the on-disk caches
+"""
+from unittest import TestCase, main
+import marshal, os, tempfile
+from cache import Store, TableCache, digest
+from factory import Parser, building_schema
+from project import Project
+
+class TestStore(TestCase):
+    """
+    Test the content addressed Store
+    """
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.store = Store(self.tmp.name, '.bin', max_size=10)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_get_put(self):
+        key = digest('a')
+        self.assertIsNone(self.store.get(key))
+        self.store.put_bytes(key, b'abc')
+        self.assertEqual(self.store.get(key).read_bytes(), b'abc')
+
+    def test_digest(self):
+        self.assertNotEqual(digest('ab', 'c'), digest('a', 'bc'))
+        self.assertEqual(digest('ab'), digest(b'ab'))
+
+    def test_prune(self):
+        """Least recently used entries are evicted first"""
+        keys = [digest(str(i)) for i in range(3)]
+        for i, key in enumerate(keys):
+            path = self.store.put_bytes(key, b'12345')
+            os.utime(path, (i, i))
+        self.store.get(keys[0])
+        self.store.prune()
+        self.assertIsNotNone(self.store.get(keys[0]))
+        self.assertIsNone(self.store.get(keys[1]))
+        self.assertIsNotNone(self.store.get(keys[2]))
+
+
+class TestTableCache(TestCase):
+    """
+    Test caching parsed schedules
+    """
+    text = 'Home Story\tZone Category Code\tMeasured Area\t\nTERREO\tC\t1,051.04\t\nATICO\tNC\t17.28\t\n'
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.cache = TableCache(self.tmp.name)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_rows(self):
+        """Parsed rows are stored on a miss and loaded on a hit"""
+        records = Parser.parse(self.text, building_schema, cache=self.cache)
+        self.assertEqual(records[0].area, 1051.04)
+        key = self.cache.key(self.text, building_schema)
+        self.assertEqual(marshal.loads(self.cache.get(key).read_bytes()), [tuple(r) for r in records])
+        self.cache.put_bytes(key, marshal.dumps([('CACHED', 'C', 1.0)]))
+        self.assertEqual(Parser.parse(self.text, building_schema, cache=self.cache)[0].story, 'CACHED')
+        self.assertEqual(Parser.parse(self.text, 'story:str category:str area:str', cache=self.cache)[0].area, '1,051.04')
+
+    def test_corrupt(self):
+        """Unreadable entries are parsed again and replaced"""
+        key = self.cache.key(self.text, building_schema)
+        self.cache.put_bytes(key, b'\xff')
+        self.assertEqual(len(Parser.parse(self.text, building_schema, cache=self.cache)), 2)
+        self.assertEqual(len(marshal.loads(self.cache.get(key).read_bytes())), 2)
+
+    def test_project(self):
+        """Only the project given the cache parses through it"""
+        sample = os.path.join(os.path.dirname(__file__), '..', 'sample')
+        entries = lambda : [name for _, _, names in os.walk(self.tmp.name) for name in names]
+        Project(sample).load()
+        self.assertEqual(entries(), [])
+        lot = Project(sample, self.cache).load().lot
+        self.assertTrue(entries())
+        self.assertEqual(Project(sample, self.cache).load().lot.area, lot.area)
+
+
+if __name__ == '__main__':
+    main()
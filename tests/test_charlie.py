@@ -0,0 +1,189 @@
+#!/usr/bin/env python
+"""
+Tests for Charlie using a stand-in for pdflatex
+"""
+from unittest import TestCase, main
+from pathlib import Path
+import sys, tempfile
+from aux import Charlie, Stage
+from cache import BuildCache
+from pdfsplit import PdfReader
+
+fake_engine = """#!{}
+import sys, pathlib
+sys.path.insert(0, {!r})
+from test_pdfsplit import build_pdf
+args = sys.argv[1:]
+out = pathlib.Path(args[args.index('-output-directory') + 1])
+src = pathlib.Path(args[-1])
+text = src.read_text()
+options = dict(arg[1:].split('=', 1) for arg in args if arg.startswith('-') and '=' in arg)
+job = options.get('jobname', src.stem)
+if '-ini' in args:
+    if 'NOFMT' in text:
+        sys.exit(1)
+    (out / (job + '.fmt')).write_text(text)
+    sys.exit(0)
+if 'fmt' in options and ('\\documentclass' in text or not pathlib.Path(options['fmt']).exists()):
+    sys.exit(1)
+if 'fmt' in options and 'BADFMT' in pathlib.Path(options['fmt']).read_text():
+    sys.exit(1)
+(out / (job + '.aux')).write_text('aux')
+if 'FAIL' in text:
+    sys.exit(1)
+parts = text.count('\\\\the\\\\ReadonlyShipoutCounter') - 1
+if parts > 0:
+    bodies = text.split('\\\\setcounter{{page}}{{1}}')[1:]
+    pages = [body.split('\\n')[3].encode() for body in bodies]
+    (out / (job + '.pages')).write_text(''.join('%d %d\\n' % (i, i) for i in range(parts)) + 'end %d' % parts)
+    (out / (job + '.pdf')).write_bytes(build_pdf(pages))
+else:
+    (out / (job + '.pdf')).write_bytes(build_pdf([text.encode()]))
+"""
+
+preamble = '\\documentclass{article}\n\\begin{document}\n'
+end = '\n\\end{document}\n'
+
+class TestCharlie(TestCase):
+    """
+    Test compilation of a directory of .tex files
+    """
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.root = Path(self.tmp.name)
+        self.engine = self.root / 'pdflatex'
+        self.engine.write_text(fake_engine.format(sys.executable, str(Path(__file__).parent.absolute())))
+        self.engine.chmod(0o755)
+        self.work_dir = self.root / 'work'
+        self.work_dir.mkdir()
+        for name in 'a b c'.split():
+            (self.work_dir / f'{name}.tex').write_text(preamble + name + end)
+        (self.work_dir / 'bad.tex').write_text(preamble + 'FAIL' + end)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_pdfy(self):
+        """Every file gets compiled, exit statuses are reported and
+        auxiliary files stay out of out_path"""
+        charlie = Charlie(self.work_dir, self.work_dir, jobs=3)
+        charlie.engine = str(self.engine)
+        statuses = charlie.pdfy()
+        self.assertEqual(statuses, {'a.tex': 0, 'b.tex': 0, 'bad.tex': 1, 'c.tex': 0})
+        names = sorted(p.name for p in self.work_dir.iterdir())
+        self.assertEqual(names, ['a.pdf', 'a.tex', 'b.pdf', 'b.tex', 'bad.tex', 'c.pdf', 'c.tex'])
+
+    def test_combined(self):
+        """Files sharing a preamble are compiled in one run and split into a pdf each,
+        failing the combined run falls back to compiling files one by one"""
+        charlie = Charlie(self.work_dir, self.work_dir, jobs=2, combined=True)
+        charlie.engine = str(self.engine)
+        statuses = charlie.pdfy()
+        self.assertEqual(statuses, {'a.tex': 0, 'b.tex': 0, 'bad.tex': 1, 'c.tex': 0})
+        (self.work_dir / 'bad.tex').unlink()
+        statuses = charlie.pdfy()
+        self.assertEqual(statuses, {'a.tex': 0, 'b.tex': 0, 'c.tex': 0})
+        for name in 'abc':
+            reader = PdfReader((self.work_dir / f'{name}.pdf').read_bytes())
+            self.assertEqual(len(reader.pages), 1)
+            self.assertIn(b'(' + name.encode() + b')', reader.data)
+        self.assertEqual(sorted(p.name for p in self.work_dir.iterdir() if p.suffix != '.tex'),
+                         ['a.pdf', 'b.pdf', 'c.pdf'])
+
+    def test_shards(self):
+        """Shards are compiled and merged into a single pdf in order"""
+        for i, text in enumerate(['one', 'two', 'three'], 1):
+            (self.work_dir / f'x.part-{i:03d}.tex').write_text(preamble + text + end)
+        (self.work_dir / 'bad.tex').unlink()
+        charlie = Charlie(self.work_dir, self.work_dir, jobs=3)
+        charlie.engine = str(self.engine)
+        self.assertEqual(charlie.pdfy(), {'a.tex': 0, 'b.tex': 0, 'c.tex': 0, 'x.tex': 0})
+        reader = PdfReader((self.work_dir / 'x.pdf').read_bytes())
+        self.assertEqual(len(reader.pages), 3)
+        self.assertLess(reader.data.index(b'one'), reader.data.index(b'two'))
+        self.assertFalse(list(self.work_dir.glob('x.part-*.pdf')))
+
+    def test_combined_shards(self):
+        """Shards are compiled on their own even when combining, other files are combined"""
+        for i, text in enumerate(['one', 'two'], 1):
+            (self.work_dir / f'x.part-{i:03d}.tex').write_text(preamble + text + end)
+        (self.work_dir / 'bad.tex').unlink()
+        charlie = Charlie(self.work_dir, self.work_dir, jobs=2, combined=True)
+        charlie.engine = str(self.engine)
+        self.assertEqual(charlie.pdfy(), {'a.tex': 0, 'b.tex': 0, 'c.tex': 0, 'x.tex': 0})
+        self.assertEqual((self.work_dir / 'x.pdf').read_bytes().count(b'documentclass'), 2)
+        self.assertNotIn(b'documentclass', (self.work_dir / 'a.pdf').read_bytes())
+
+    def test_cache(self):
+        """Second run reuses cached pdfs without running the engine"""
+        cache = BuildCache(self.root / 'cache')
+        charlie = Charlie(self.work_dir, self.work_dir, jobs=2, cache=cache)
+        charlie.engine = str(self.engine)
+        charlie.pdfy()
+        for pdf in self.work_dir.glob('*.pdf'):
+            pdf.unlink()
+        charlie.engine = str(self.root / 'missing-engine')
+        (self.work_dir / 'bad.tex').unlink()
+        statuses = charlie.pdfy()
+        self.assertEqual(statuses, {'a.tex': 0, 'b.tex': 0, 'c.tex': 0})
+        self.assertEqual(len(list(self.work_dir.glob('*.pdf'))), 3)
+
+    def test_formats(self):
+        """Bodies are compiled against a format of their preamble, dumped once
+        and cached, documents whose preamble can't be dumped compile as they are"""
+        cache = BuildCache(self.root / 'cache', engine=str(self.engine))
+        (self.work_dir / 'bad.tex').write_text('\\documentclass{report}NOFMT\n\\begin{document}\nd' + end)
+        charlie = Charlie(self.work_dir, self.work_dir, jobs=3, cache=cache)
+        charlie.engine = str(self.engine)
+        statuses = charlie.pdfy()
+        self.assertEqual(statuses, {'a.tex': 0, 'b.tex': 0, 'bad.tex': 0, 'c.tex': 0})
+        self.assertEqual(len(list(cache.formats.path.glob('*/*.fmt'))), 1)
+        for name in 'abc':
+            self.assertNotIn(b'documentclass', (self.work_dir / f'{name}.pdf').read_bytes())
+        self.assertIn(b'documentclass', (self.work_dir / 'bad.pdf').read_bytes())
+        cache = BuildCache(self.root / 'cache', engine=str(self.engine))
+        combined = Charlie(self.work_dir, self.root, jobs=2, cache=cache, combined=True)
+        combined.engine = str(self.engine)
+        for tex in self.work_dir.glob('*.tex'):
+            tex.write_text(tex.read_text() + '%')
+        self.assertEqual(combined.pdfy(), {'a.tex': 0, 'b.tex': 0, 'bad.tex': 0, 'c.tex': 0})
+        self.assertEqual(len(list(cache.formats.path.glob('*/*.fmt'))), 1)
+
+    def test_failed_format(self):
+        """A format documents fail against is marked failed and not tried again,
+        not even by later runs"""
+        cache = BuildCache(self.root / 'cache', engine=str(self.engine))
+        (self.work_dir / 'bad.tex').unlink()
+        for name in 'abc':
+            (self.work_dir / f'{name}.tex').write_text('\\documentclass{report}%BADFMT\n\\begin{document}\n' + name + end)
+        charlie = Charlie(self.work_dir, self.work_dir, jobs=1, cache=cache)
+        charlie.engine = str(self.engine)
+        self.assertEqual(charlie.pdfy(), {'a.tex': 0, 'b.tex': 0, 'c.tex': 0})
+        self.assertEqual(len(list(cache.formats.path.glob('*/*.failed'))), 1)
+        self.assertIsNone(charlie.format_for(self.work_dir / 'b.tex'))
+        cache = BuildCache(self.root / 'cache', engine=str(self.engine))
+        self.assertIsNone(Charlie(self.work_dir, self.work_dir, cache=cache).format_for(self.work_dir / 'a.tex'))
+
+
+class TestStage(TestCase):
+    """
+    Test building in a scratch directory and publishing the results
+    """
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.out_path = Path(self.tmp.name) / 'unscheduler'
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_publish(self):
+        with Stage(self.out_path) as stage:
+            (stage.path / 'a.tex').write_text('a')
+            (stage.path / 'a.pdf').write_bytes(b'%PDF-1.4')
+            self.assertEqual(stage.publish(), ['a.pdf'])
+        self.assertFalse(stage.path.exists())
+        self.assertEqual([p.name for p in self.out_path.iterdir()], ['a.pdf'])
+
+
+if __name__ == '__main__':
+    main()
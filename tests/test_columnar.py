@@ -0,0 +1,41 @@
+#!/usr/bin/env python
+"""
+Tests for the columnar schedule representation
+"""
+from unittest import TestCase, main, skipIf
+import columnar
+from columnar import Columns
+
+records = [('TERREO', 'C', 5.0), ('SEGUNDO', 'C', 5.0), ('TERREO', 'NC', 2.5),
+           ('SEGUNDO', 'NC', 1.0), ('TERREO', 'C', 1.5)]
+
+class TestColumns(TestCase):
+    """
+    Test group by of areas per story
+    """
+    def test_totals(self):
+        columns = Columns.from_records(records)
+        self.assertEqual(columns.stories, ['TERREO', 'SEGUNDO'])
+        self.assertEqual(len(columns), 5)
+        self.assertEqual(columns.totals(), ([6.5, 5.0], [2.5, 1.0]))
+
+    def test_totals_without_numpy(self):
+        np, columnar.np = columnar.np, None
+        try:
+            columns = Columns.from_records(records)
+            self.assertEqual(columns.totals(), ([6.5, 5.0], [2.5, 1.0]))
+        finally:
+            columnar.np = np
+
+    @skipIf(columnar.np is None, 'numpy not installed')
+    def test_numpy(self):
+        columns = Columns.from_records(records)
+        self.assertEqual(columns.areas.dtype, columnar.np.float64)
+
+    def test_invalid_category(self):
+        with self.assertRaises(ValueError):
+            Columns.from_records([('TERREO', 'X', 1.0)])
+
+
+if __name__ == '__main__':
+    main()
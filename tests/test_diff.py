@@ -0,0 +1,94 @@
+#!/usr/bin/env python
+"""
+Tests for the revision diff
+"""
+from unittest import TestCase, main
+from argparse import Namespace
+from contextlib import redirect_stderr, redirect_stdout
+from pathlib import Path
+import io, json, shutil, tempfile
+from project import Project
+from diff import diff, format_diff, same, snapshot, write_diff
+
+sample = Path(__file__).parent / '..' / 'sample'
+
+class TestDiff(TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.base = Path(self.tmp.name) / 'base'
+        self.root = Path(self.tmp.name) / 'project'
+        shutil.copytree(sample, self.base)
+        shutil.copytree(sample, self.root)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def edit(self, name, old, new):
+        path = self.root / 'publisher' / 'schedules' / name
+        path.write_bytes(path.read_bytes().replace(old, new, 1))
+
+    def test_unchanged(self):
+        """Identical revisions are never loaded"""
+        project = Project(self.root)
+        self.assertEqual(diff(project, self.base), {})
+        self.assertIsNone(project.lot)
+        self.assertEqual(format_diff({}), 'No changes\n')
+
+    def test_changed_model(self):
+        self.edit('r1.txt', b'51.04', b'53.04')
+        changes = diff(Project(self.root), self.base)
+        self.assertEqual(list(changes), ['r1', 'subplot-areas', 'suplot-stats', 'lot-stats'])
+        self.assertIn(('TERREO PAV', 'area_comp', 51.04, 53.04), changes['r1'])
+        (row, column, old, new), = [change for change in changes['lot-stats'] if change[1] == 'area_comp']
+        self.assertAlmostEqual(new - old, 40)
+        self.assertIn('r1:\n  TERREO PAV area_comp: 51.04 -> 53.04\n', format_diff(changes))
+
+    def test_snapshot(self):
+        """A saved snapshot is as good a base as a directory"""
+        path = Path(self.tmp.name) / 'base.json'
+        path.write_text(json.dumps(snapshot(Project(self.base))))
+        self.assertEqual(diff(Project(self.root), path), {})
+        self.edit('topografico.txt', b'263.31', b'264.31')
+        changes = diff(Project(self.root), path)
+        self.assertEqual(changes, diff(Project(self.root), self.base))
+        self.assertIn('topografico', changes)
+        self.assertNotIn('r1', changes)
+
+    def test_added(self):
+        config = self.root / 'config.ini'
+        config.write_text(config.read_text().replace('arquivos = r1 rec1 rec2', 'arquivos = r1 rec1'))
+        config.write_text(config.read_text().replace('21 = rec2', '21 = rec1'))
+        changes = diff(Project(self.base), self.root)
+        self.assertEqual(changes['rec2'], 'added')
+        self.assertIn('subplot-areas', changes)
+
+    def write_diff(self, base):
+        args = Namespace(diff=base, no_cache=True)
+        out, err = io.StringIO(), io.StringIO()
+        with redirect_stdout(out), redirect_stderr(err):
+            status = write_diff(self.root, args)
+        return status, out.getvalue(), err.getvalue()
+
+    def test_status(self):
+        """0 when nothing changed, 1 when something did and 2 when a revision can't be read"""
+        self.assertEqual(self.write_diff(self.base), (0, 'No changes\n', ''))
+        self.edit('r1.txt', b'51.04', b'53.04')
+        self.assertEqual(self.write_diff(self.base)[0], 1)
+        broken = Path(self.tmp.name) / 'broken.json'
+        broken.write_text('{')
+        empty = Path(self.tmp.name) / 'empty'
+        empty.mkdir()
+        for base in [Path(self.tmp.name) / 'missing', broken, empty]:
+            status, out, err = self.write_diff(base)
+            self.assertEqual((status, out), (2, ''))
+            self.assertIn(str(base), err)
+
+    def test_same(self):
+        self.assertTrue(same(0.1 + 0.2, 0.3))
+        self.assertFalse(same(1.0, 1.01))
+        self.assertFalse(same(None, 0.0))
+        self.assertTrue(same('a', 'a'))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,6 +1,6 @@
 from pathlib import Path
 import unittest
-from factory import Parser, SiteFactory, BuildingFactory, SubplotFactory, SiteFactory
+from factory import Parser, Schema, SiteFactory, BuildingFactory, SubplotFactory, SiteFactory
 
 schedules = Path('samples')
 
@@ -31,6 +31,15 @@ class TestParser(unittest.TestCase):
         for e, record in zip(l, self.parser.table):
             self.assertEqual(e, list(record))
 
+    def test_iterparse(self):
+        """Records are cast according to the schema and the record class is shared"""
+        lines = ['id\tname\tarea\t\n', '1\t101\t1,877.58\t\n', '\n', '2\tres\t10\t\n']
+        schema = 'id:int name:str area:float'
+        records = list(Parser.iterparse(iter(lines), schema))
+        self.assertEqual([tuple(r) for r in records], [(1, '101', 1877.58), (2, 'res', 10.0)])
+        self.assertIs(type(records[0]), Schema.compile(schema).record)
+        self.assertIs(Schema.compile('id name area').record, Schema.compile('id:int name area').record)
+
             
 class TestBuildingFactory(unittest.TestCase):
 
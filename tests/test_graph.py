@@ -0,0 +1,73 @@
+#!/usr/bin/env python
+"""
+Tests for the input to output dependency graph
+"""
+from unittest import TestCase, main
+from pathlib import Path
+import shutil, tempfile
+from aux import ProjectInfo
+from graph import BuildState, dependencies, input_digests, plan
+from project import Project
+
+sample = Path(__file__).parent / '..' / 'sample'
+
+class TestGraph(TestCase):
+    """
+    Test which outputs each input feeds and the rebuild plan
+    """
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.root = Path(self.tmp.name) / 'project'
+        shutil.copytree(sample, self.root)
+        self.project = Project(self.root)
+        self.project.info = ProjectInfo(self.project.config)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def feeds(self, name):
+        return {output for output, inputs in dependencies(self.project.info).items() if name in inputs}
+
+    def test_dependencies(self):
+        self.assertEqual(self.feeds('r1.txt'), {'r1', 'subplot-areas', 'suplot-stats', 'lot-stats'})
+        self.assertEqual(self.feeds('topografico.txt'), {'topografico', 'lot-stats'})
+        self.assertEqual(self.feeds('area_perm.txt'), {'suplot-stats', 'lot-stats'})
+
+    def test_plan(self):
+        state = BuildState(self.project.out)
+        self.assertEqual(len(plan(self.project, state)), 9)
+        graph = dependencies(self.project.info)
+        digests = input_digests(self.project, set().union(*graph.values()))
+        self.project.out.mkdir()
+        for output, inputs in graph.items():
+            state.record(output, {name : digests[name] for name in inputs})
+            (self.project.out / f'{output}.pdf').write_bytes(b'')
+        state.save()
+        self.assertEqual(plan(self.project, BuildState(self.project.out)), {})
+        with (self.project.schedules / 'topografico.txt').open('a') as f:
+            f.write('\n')
+        (self.project.out / 'tos.pdf').unlink()
+        expected = {'topografico' : ['topografico.txt changed'],
+                    'lot-stats' : ['topografico.txt changed'],
+                    'tos' : ['tos.pdf missing']}
+        self.assertEqual(plan(self.project, BuildState(self.project.out)), expected)
+
+    def test_relations_file(self):
+        """Relations moved to a file feed the same tables and are reloaded on change"""
+        expected = Project(self.root).load().lot.super_building.area_comp
+        config = self.project.config.read_text()
+        head, relations = config.split('[relations]')
+        lines = [line.replace(' = ', '\t') for line in relations.splitlines() if line.strip()]
+        (self.project.schedules / 'relations.txt').write_text('\n'.join(lines) + '\n')
+        self.project.config.write_text(head.replace('[misc]\n', '[misc]\nrelacoes = relations.txt\n'))
+        self.project.load()
+        self.assertEqual(self.feeds('relations.txt'), {'subplot-areas', 'suplot-stats', 'lot-stats'})
+        self.assertEqual(self.project.lot.super_building.area_comp, expected)
+        with (self.project.schedules / 'relations.txt').open('a') as f:
+            f.write('21-22\tnull\n')
+        with self.assertRaises(ValueError):
+            self.project.update({'relations.txt'})
+
+
+if __name__ == '__main__':
+    main()
@@ -3,7 +3,11 @@
 
 """
 from unittest import TestCase, main
-from aux import ProjectInfo
+from pathlib import Path
+import tempfile
+import aux
+from aux import ProjectInfo, normalize, read_texts, parse_ids
+from building import Building
 
 class TestProjectInfo(TestCase):
     """
@@ -44,6 +48,113 @@ class TestProjectInfo(TestCase):
         self.assertEqual(self.pi.topografico.quadricula, quadricula)
         self.assertEqual(self.pi.topografico.ind_fiscal, ind_fiscal)
 
+    def test_schedule_files(self):
+        files = ['r1.txt', 'rec1.txt', 'rec2.txt', 'subplots.txt', 'area_perm.txt', 'topografico.txt']
+        self.assertEqual(self.pi.schedule_files(), files)
+
+    def test_relations(self):
+        self.assertEqual(len(self.pi.relation_models), 23)
+        self.assertEqual(self.pi.relation_models[21], ['rec2'])
+        self.assertEqual(self.pi.relations_file, None)
+
+
+class TestRelations(TestCase):
+    """
+    Test range and list keys of relations, the relations file and their validation
+    """
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.config = Path(self.tmp.name) / 'config.ini'
+        self.sample = Path('samples/config.ini').read_text().split('[relations]')[0]
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def info(self, relations, misc=''):
+        self.config.write_text(self.sample.replace('[misc]\n', '[misc]\n' + misc) + '[relations]\n' + relations)
+        return ProjectInfo(self.config)
+
+    def test_parse_ids(self):
+        self.assertEqual(parse_ids('7'), [7])
+        self.assertEqual(parse_ids('1-3'), [1, 2, 3])
+        self.assertEqual(parse_ids('21, 23,25-26'), [21, 23, 25, 26])
+        for key in ['a', '3-1', '1-', '']:
+            with self.assertRaises(ValueError):
+                parse_ids(key)
+
+    def test_ranges(self):
+        pi = self.info('0 = null\n1-20 = r1\n21,22 = rec2 rec1\n')
+        self.assertEqual(pi.relation_models, {0: ['null'], **dict.fromkeys(range(1, 21), ['r1']),
+                                              21: ['rec2', 'rec1'], 22: ['rec2', 'rec1']})
+        buildings = [Building.get_null_building(), *(Building(model, [], 0) for model in ['r1', 'rec1', 'rec2'])]
+        pi.build_relations(buildings)
+        self.assertEqual([b.model for b in pi.relations[22]], ['rec2', 'rec1'])
+
+    def test_validation(self):
+        """Every problem is reported at once"""
+        with self.assertRaises(ValueError) as cm:
+            self.info('1-20 = r1\n20 = r2\n2-1 = r1\n')
+        message = str(cm.exception)
+        for error in ['subplot 20 related twice', 'unknown model r2', "malformed subplot ids '2-1'"]:
+            self.assertIn(error, message)
+
+    def test_repeated_key(self):
+        """A key given twice is reported like any other id related twice"""
+        with self.assertRaises(ValueError) as cm:
+            self.info('0 = null\n21 = rec2\n21 = rec1\nbad line\n')
+        self.assertIn('subplot 21 related twice', str(cm.exception))
+        self.assertIn("malformed subplot ids 'bad line'", str(cm.exception))
+        pi = self.info('0 = null\n# comment\n1-2 = r1\n    rec1\n\n[extra]\na = 1\n')
+        self.assertEqual(pi.relation_models, {0: ['null'], 1: ['r1', 'rec1'], 2: ['r1', 'rec1']})
+        self.assertEqual(pi._config.get('extra', 'a'), '1')
+
+    def test_relations_file(self):
+        pi = self.info('0 = null\n', misc='relacoes = relations.txt\n')
+        self.assertEqual(pi.schedule_files()[-1], 'relations.txt')
+        text = '# id\tmodels\n1-20\tr1\n\n21,22\trec1 rec2\n'
+        buildings = [Building.get_null_building(), *(Building(model, [], 0) for model in ['r1', 'rec1', 'rec2'])]
+        pi.build_relations(buildings, text)
+        self.assertEqual(sorted(pi.relations), list(range(23)))
+        self.assertEqual(pi.relation_models, {0: ['null']})
+        with self.assertRaises(ValueError) as cm:
+            pi.build_relations(buildings, '0\tr1\n')
+        self.assertIn('relations.txt', str(cm.exception))
+
+
+class TestReadTexts(TestCase):
+    """
+    Test reading and normalization of schedule files
+    """
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = Path(self.tmp.name)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_normalize(self):
+        """Lone 0xa0 bytes, utf8 non breaking spaces and carriage returns are removed
+        while multibyte characters survive"""
+        data = b'0\tAREA\t1\xa0877.58\t\r\n' + 'TÉRREO à\u00a0\r\n'.encode()
+        self.assertEqual(normalize(data), '0\tAREA\t1877.58\t\nTÉRREO à\n')
+
+    def test_lazy(self):
+        (self.path / 'a.txt').write_bytes(b'a\r\n')
+        (self.path / 'b.txt').write_bytes(b'b\r\n')
+        texts = read_texts(self.path, ['a.txt'])
+        self.assertEqual(list(texts), ['a.txt'])
+        self.assertEqual(texts._texts, {})
+        self.assertEqual(texts['a.txt'], 'a\n')
+        with self.assertRaises(KeyError):
+            texts['b.txt']
+
+    def test_mmap(self):
+        big = b'TERREO\tC\t1\xa0000.00\t\r\n' * 100000
+        (self.path / 'big.txt').write_bytes(big)
+        self.assertGreater(len(big), aux.mmap_threshold)
+        texts = read_texts(self.path)
+        self.assertEqual(texts['big.txt'], 'TERREO\tC\t1000.00\t\n' * 100000)
+
 
 if __name__ == '__main__':
     main()       
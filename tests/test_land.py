@@ -3,7 +3,9 @@
 
 """
 from unittest import TestCase, main
+import sys
 from land import Land
+from building import Building, Story
 
 class TestLand(TestCase):
     """
@@ -22,10 +24,35 @@ class TestLand(TestCase):
         with self.assertRaises(AttributeError):
             land = Land(0, 'test-land', 10, random_attr=3)
 
+    def test_memory(self):
+        land = Land(0, 'test-land', 10)
+        self.assertLessEqual(sys.getsizeof(land), 112)
+        self.assertFalse(hasattr(land, '__dict__'))
+
     def test_calculations(self):
         """ """
         pass
 
+    def test_lazy_aggregates(self):
+        """Aggregates are computed once and recomputed after an input is assigned"""
+        land = Land(0, 'test-land', 10, area_perm=3)
+        self.assertEqual(land._aggregates, {})
+        self.assertEqual(land.taxa_perm, 30)
+        self.assertEqual(land.coef_aprov, 0)
+        sup = land.super_building
+        self.assertIs(land.super_building, sup)
+        land.buildings = [Building('b', [Story(0, 'terreo', 5, 1)])]
+        self.assertEqual(land.coef_aprov, 0.5)
+        self.assertEqual(land.taxa_ocp, 50)
+        land.area = 20
+        self.assertEqual(land.coef_aprov, 0.25)
+        land.area_perm = 2
+        self.assertEqual(land.taxa_perm, 10)
+        with self.assertRaises(AttributeError):
+            land.coef_aprov = 1
+        with self.assertRaises(AttributeError):
+            Land(0, 'test-land', 10, taxa_ocp=3)
+
     
 
 if __name__ == '__main__':
@@ -0,0 +1,88 @@
+#!/usr/bin/env python
+"""
+Tests for the pure python PDF page extractor
+"""
+from unittest import TestCase, main
+from pdfsplit import PdfReader, dict_value, merge
+
+def build_pdf(contents):
+    """Build a PDF in the layout pdflatex uses: stream lengths stored in separate
+    objects and resources inherited from the page tree"""
+    objects = {}
+    n = len(contents)
+    # 1 catalog, 2 pages, 3 font, then per page: page, content, length
+    objects[1] = b'<< /Type /Catalog /Pages 2 0 R >>'
+    kids = b' '.join(b'%d 0 R' % (4 + 3 * i) for i in range(n))
+    objects[2] = b'<< /Type /Pages /Count %d /Kids [%s] /Resources << /Font << /F1 3 0 R >> >> /MediaBox [0 0 200 200] >>' % (n, kids)
+    objects[3] = b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>'
+    for i, text in enumerate(contents):
+        page, content, length = 4 + 3 * i, 5 + 3 * i, 6 + 3 * i
+        stream = b'BT /F1 12 Tf 20 100 Td (' + text + b') Tj ET % endobj 9 0 obj\n'
+        objects[page] = b'<< /Type /Page /Parent 2 0 R /Contents %d 0 R >>' % content
+        objects[content] = (b'<< /Length %d 0 R >>' % length, stream)
+        objects[length] = b'%d' % len(stream)
+    out = bytearray(b'%PDF-1.5\n')
+    offsets = {}
+    for number in sorted(objects):
+        offsets[number] = len(out)
+        obj = objects[number]
+        if isinstance(obj, tuple):
+            out += b'%d 0 obj\n%s\nstream\n%s\nendstream\nendobj\n' % (number, obj[0], obj[1])
+        else:
+            out += b'%d 0 obj\n%s\nendobj\n' % (number, obj)
+    xref = len(out)
+    out += b'xref\n0 %d\n0000000000 65535 f \n' % (len(objects) + 1)
+    for number in sorted(objects):
+        out += b'%010d 00000 n \n' % offsets[number]
+    out += b'trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n' % (len(objects) + 1, xref)
+    return bytes(out)
+
+
+class TestPdfReader(TestCase):
+    """
+    Test reading the page tree and extracting pages
+    """
+    def setUp(self):
+        self.data = build_pdf([b'page one', b'page two', b'page three'])
+
+    def test_pages(self):
+        reader = PdfReader(self.data)
+        self.assertEqual(len(reader.pages), 3)
+        self.assertEqual(reader.objects[5].stream[:2], b'BT')
+
+    def test_extract(self):
+        """Extracted pages keep their content and inherited resources"""
+        out = PdfReader(self.data).extract(range(1, 3))
+        reader = PdfReader(out)
+        self.assertEqual(len(reader.pages), 2)
+        page, ancestors = reader.pages[0]
+        self.assertIn(b'/MediaBox [0 0 200 200]', page.head)
+        self.assertIsNotNone(dict_value(page.head, b'/Resources'))
+        content = reader.objects[int(dict_value(page.head, b'/Contents').split()[0])]
+        self.assertIn(b'(page two)', content.stream)
+        self.assertNotIn(b'page one', out)
+
+    def test_merge(self):
+        """Pages of several documents are merged in order"""
+        other = PdfReader(build_pdf([b'page four']))
+        reader = PdfReader(merge([(PdfReader(self.data), [2, 0]), (other, [0])]))
+        texts = []
+        for page, _ in reader.pages:
+            content = reader.objects[int(dict_value(page.head, b'/Contents').split()[0])]
+            texts.append(content.stream.split(b'(')[1].split(b')')[0])
+        self.assertEqual(texts, [b'page three', b'page one', b'page four'])
+
+    def test_dict_value(self):
+        head = b'<< /Type /Page /Resources << /Font << /F1 3 0 R >> >> /Contents 5 0 R /Rotate 90 >>'
+        self.assertEqual(dict_value(head, b'/Resources'), b'<< /Font << /F1 3 0 R >> >>')
+        self.assertEqual(dict_value(head, b'/Contents'), b'5 0 R')
+        self.assertEqual(dict_value(head, b'/Rotate'), b'90')
+        self.assertIsNone(dict_value(head, b'/MediaBox'))
+
+    def test_object_streams(self):
+        with self.assertRaises(ValueError):
+            PdfReader(b'%PDF-1.5\n1 0 obj\n<< /Type /XRef /Length 2 >>\nstream\nxx\nendstream\nendobj\n')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,72 @@
+#!/usr/bin/env python
+"""
+Tests for the asynchronous pipeline using a stand-in for pdflatex
+"""
+from unittest import TestCase, main
+from pathlib import Path
+import asyncio, os, shutil, sys, tempfile, time
+from aux import Charlie
+from project import Project
+from test_charlie import fake_engine
+import pipeline
+
+sample = Path(__file__).parent / '..' / 'sample'
+
+class TestPipeline(TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.root = Path(self.tmp.name) / 'project'
+        shutil.copytree(sample, self.root)
+        engine = Path(self.tmp.name) / 'pdflatex'
+        engine.write_text(fake_engine.format(sys.executable, str(Path(__file__).parent.absolute())))
+        engine.chmod(0o755)
+        Charlie.engine = str(engine)
+
+    def tearDown(self):
+        Charlie.engine = 'pdflatex'
+        self.tmp.cleanup()
+
+    def test_publish(self):
+        """Every table is compiled and published, then only changed tables are"""
+        project = Project(self.root)
+        statuses = asyncio.run(pipeline.publish(project, jobs=2))
+        names = ['lot-stats', 'null', 'r1', 'rec1', 'rec2', 'subplot-areas', 'suplot-stats', 'topografico', 'tos']
+        self.assertEqual(statuses, {f'{name}.tex' : 0 for name in names})
+        self.assertEqual(sorted(p.name for p in project.out.glob('*.pdf')), [f'{name}.pdf' for name in names])
+        self.assertEqual(asyncio.run(pipeline.publish(project, jobs=2, changed=set())), {})
+        path = project.schedules / 'rec1.txt'
+        path.write_text(path.read_text().replace('40.00', '50.00'))
+        statuses = asyncio.run(pipeline.publish(project, jobs=2, changed={'rec1.txt'}))
+        self.assertEqual(sorted(statuses), ['lot-stats.tex', 'rec1.tex', 'subplot-areas.tex', 'suplot-stats.tex'])
+
+    def test_failed_load(self):
+        """pdflatex runs started before loading fails are killed"""
+        pids = Path(self.tmp.name) / 'pids'
+        engine = Path(self.tmp.name) / 'slow-pdflatex'
+        engine.write_text('#!/bin/sh\necho $$ >> {}\nexec sleep 30\n'.format(pids))
+        engine.chmod(0o755)
+        Charlie.engine = str(engine)
+
+        class FailingProject(Project):
+            """Project whose loading fails once pdflatex is running"""
+            def update(self, changed=None, ready=None):
+                super().update(changed, ready)
+                deadline = time.monotonic() + 10
+                while not pids.exists() and time.monotonic() < deadline:
+                    time.sleep(0.01)
+                raise ValueError('broken schedule')
+
+        project = FailingProject(self.root)
+        start = time.monotonic()
+        with self.assertRaises(ValueError):
+            asyncio.run(pipeline.publish(project, jobs=2))
+        self.assertLess(time.monotonic() - start, 20)
+        started = pids.read_text().split()
+        self.assertTrue(started)
+        for pid in started:
+            with self.assertRaises(ProcessLookupError):
+                os.kill(int(pid), 0)
+        self.assertEqual(list(project.out.glob('*.pdf')), [])
+
+if __name__ == '__main__':
+    main()
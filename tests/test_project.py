@@ -0,0 +1,66 @@
+#!/usr/bin/env python
+"""
+Tests for Project and watch mode
+"""
+from unittest import TestCase, main
+from pathlib import Path
+import os, shutil, tempfile
+from project import Project
+from watch import Watcher
+
+sample = Path(__file__).parent / '..' / 'sample'
+
+class TestProject(TestCase):
+    """
+    Test loading the sample project and updating it after changes
+    """
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.root = Path(self.tmp.name) / 'project'
+        shutil.copytree(sample, self.root)
+        self.project = Project(self.root).load()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_load(self):
+        self.assertEqual([b.model for b in self.project.buildings], ['r1', 'rec1', 'rec2', 'null'])
+        self.assertEqual(len(self.project.lot.lands), 23)
+
+    def test_update(self):
+        """Only changed schedules are parsed again"""
+        r1, rec1 = self.project.buildings[:2]
+        site = self.project.site
+        path = self.project.schedules / 'rec1.txt'
+        path.write_text(path.read_text().replace('40.00', '50.00'))
+        self.project.update({'rec1.txt'})
+        self.assertIs(self.project.buildings[0], r1)
+        self.assertIsNot(self.project.buildings[1], rec1)
+        self.assertIs(self.project.site, site)
+        self.assertEqual(self.project.buildings[1].area_ncomp, 50)
+        rec = [land for land in self.project.lot.lands if land.buildings == [self.project.buildings[1]]]
+        self.assertEqual(rec[0].super_building.area_ncomp, 50)
+
+    def test_record_loaded_digests(self):
+        """Inputs edited during a build are recorded as loaded, so the next plan rebuilds them"""
+        self.project.out.mkdir()
+        for name in ['rec1', 'topografico']:
+            (self.project.out / f'{name}.pdf').write_bytes(b'')
+        path = self.project.schedules / 'rec1.txt'
+        path.write_text(path.read_text().replace('40.00', '50.00'))
+        self.project.record({'rec1.tex' : 0, 'topografico.tex' : 0})
+        plan = self.project.plan()
+        self.assertEqual(plan['rec1'], ['rec1.txt changed'])
+        self.assertNotIn('topografico', plan)
+
+    def test_watcher(self):
+        watcher = Watcher(self.project, interval=0.01, debounce=0.01)
+        self.assertEqual(watcher.poll(), set())
+        path = self.project.schedules / 'r1.txt'
+        os.utime(path, ns=(0, 0))
+        (self.project.schedules / 'new.txt').write_text('')
+        self.assertEqual(watcher.wait(), {'r1.txt', 'new.txt'})
+
+
+if __name__ == '__main__':
+    main()
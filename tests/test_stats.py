@@ -0,0 +1,41 @@
+#!/usr/bin/env python
+"""
+Tests for the JSON and CSV stats backend
+"""
+from unittest import TestCase, main
+from pathlib import Path
+import csv, io, json
+from project import Project
+from stats import write_json, write_csv
+
+sample = Path(__file__).parent / '..' / 'sample'
+
+class TestStats(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.project = Project(sample).load()
+
+    def test_json(self):
+        f = io.StringIO()
+        write_json(self.project.site, self.project.lot, f)
+        stats = json.loads(f.getvalue())
+        lot = self.project.lot
+        self.assertEqual(stats['lot']['taxa_ocp'], lot.taxa_ocp)
+        self.assertEqual(stats['lot']['units'], 20)
+        self.assertEqual(stats['lot']['area_remanescente'], 5102.88)
+        self.assertEqual(len(stats['subplots']), len(lot.lands))
+        self.assertEqual(stats['subplots'][0]['name'], lot.lands[0].name)
+
+    def test_csv(self):
+        f = io.StringIO()
+        write_csv(self.project.site, self.project.lot, f)
+        rows = list(csv.DictReader(io.StringIO(f.getvalue())))
+        self.assertEqual(len(rows), len(self.project.lot.lands) + 1)
+        self.assertEqual(rows[-1]['name'], 'lote')
+        self.assertAlmostEqual(float(rows[-1]['area']), self.project.lot.area)
+        self.assertEqual([rows[-1][key] for key in ['taxa_ocp', 'coef_aprov', 'taxa_perm']], ['-'] * 3)
+        self.assertAlmostEqual(float(rows[0]['coef_aprov']), self.project.lot.lands[0].coef_aprov)
+
+
+if __name__ == '__main__':
+    main()
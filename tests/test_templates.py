@@ -0,0 +1,113 @@
+#!/usr/bin/env python
+"""
+Tests for the template engine used by the formatters
+"""
+from unittest import TestCase, main
+from pathlib import Path
+import io, tempfile
+import tables
+from tables import Template, SubAreasFormatter, escape
+from project import Project
+from building import Building, Story, StoryIndex
+from land import Land, Lot
+
+sample = Path(__file__).parent / '..' / 'sample'
+
+class TestTemplate(TestCase):
+    """
+    Test parsing and rendering of templates
+    """
+    def test_render(self):
+        template = Template('\\begin{{tabular}}{{{}}}\n{}\n\\end{{tabular}}')
+        self.assertEqual(template.fields, 2)
+        out = io.StringIO()
+        template.render(out, ['ll', lambda out : out.write('a & b')])
+        self.assertEqual(out.getvalue(), '\\begin{tabular}{ll}\na & b\n\\end{tabular}')
+        self.assertEqual(template.format('l', 'x', 'ignored'), '\\begin{tabular}{l}\nx\n\\end{tabular}')
+        with self.assertRaises(IndexError):
+            template.format('l')
+
+    def test_registry(self):
+        """Templates are parsed once and shared"""
+        self.assertIs(tables.BuildingFormatter.template, tables.BuildingFormatter().template)
+        self.assertIsInstance(tables.TOSFormatter.template, Template)
+
+    def test_escape(self):
+        self.assertEqual(escape('SALA 1 & 2_A 50%'), 'SALA 1 \\& 2\\_A 50\\%')
+        self.assertEqual(escape('TÉRREO'), 'TÉRREO')
+
+    def test_formatter_template_override(self):
+        formatter = tables.LatexFormatter()
+        formatter.template = '{}'
+        self.assertEqual(formatter._get_latex([['a', 'b'], ['1', '2']]),
+                         '\\hline\na & b \\\\\n\\hline\n1 & 2 \\\\\n\\hline')
+
+    def test_write_tabular(self):
+        """Rows are written through precompiled formats, between hlines"""
+        formatter = tables.LatexFormatter()
+        cases = {(True, True) : 't &  \\\\\n\\hline\nh1 & h2 \\\\\n\\hline\na & b \\\\\n\\hline',
+                 (True, False) : 't &  \\\\\n\\hline\nh1 & h2 \\\\\na & b \\\\\n\\hline',
+                 (False, True) : '\\hline\nt &  \\\\\n\\hline\nh1 & h2 \\\\\na & b \\\\\n\\hline',
+                 (False, False) : '\\hline\nt &  \\\\\nh1 & h2 \\\\\na & b \\\\\n\\hline'}
+        for (title, headers), expected in cases.items():
+            formatter.title, formatter.headers = title, headers
+            out = io.StringIO()
+            formatter._write_tabular([['t', ''], ['h1', 'h2'], ['a', 'b']], out)
+            self.assertEqual(out.getvalue(), expected)
+
+class TestSubAreasShards(TestCase):
+    """
+    Test writing the subplot areas table in shards
+    """
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.out = Path(self.tmp.name)
+        self.lot = Project(sample).load().lot
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_single(self):
+        """Lots fitting a shard are written as a single file, as format renders them"""
+        paths = SubAreasFormatter().write(self.lot, self.out)
+        self.assertEqual([p.name for p in paths], ['subplot-areas.tex'])
+        self.assertEqual(paths[0].read_text(), SubAreasFormatter().format(self.lot))
+
+    def test_shards(self):
+        """Every shard repeats title and headers, rows are split in order"""
+        formatter = SubAreasFormatter()
+        formatter.rows_per_shard = 10
+        paths = formatter.write(self.lot, self.out)
+        self.assertEqual([p.name for p in paths], ['subplot-areas.part-001.tex', 'subplot-areas.part-002.tex',
+                                                   'subplot-areas.part-003.tex'])
+        whole = formatter.format(self.lot).splitlines()
+        rows = [line for line in whole if line.endswith('m$^2$ \\\\')]
+        sharded = []
+        for path in paths:
+            lines = path.read_text().splitlines()
+            self.assertEqual(lines[0], '\\pdfobjcompresslevel=0')
+            self.assertIn('SUBLOTE & COMP', path.read_text())
+            sharded.extend(line for line in lines if line.endswith('m$^2$ \\\\'))
+        self.assertEqual(sharded, rows)
+        self.assertEqual(len(rows), len(self.lot.lands) + 1)
+
+    def test_stories_by_name(self):
+        """Each row puts a land's areas under the header of the same story, zero
+        under the stories its buildings lack"""
+        low = Building('low', [Story(0, 'TERREO', 10, 1)])
+        high = Building('high', [Story(0, 'TERREO', 20, 2), Story(1, 'SUPERIOR', 30, 3)])
+        attic = Building('attic', [Story(0, 'ATICO', 0, 40)])
+        index = StoryIndex([low, high, attic])
+        lands = [Land(i, name, 100, buildings=[building], story_index=index)
+                 for i, (name, building) in enumerate([('a', high), ('b', attic), ('c', low)])]
+        lot = Lot.from_lands(0, 'lote', lands, story_index=index)
+        table = SubAreasFormatter._build_table(lot)
+        self.assertEqual(table[0][1::2], ['TERREO', 'SUPERIOR', 'ATICO', 'TOTAL'])
+        self.assertEqual({len(row) for row in table}, {9})
+        area = tables.fmt_area
+        self.assertEqual(table[3], ['B', area(0), area(0), area(0), area(0), area(0), area(40), area(0), area(40)])
+        self.assertEqual(table[4][1:5], [area(10), area(1), area(0), area(0)])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,74 @@
+#!/usr/bin/env python
+"""
+Tests for per stage tracing
+"""
+from unittest import TestCase, main
+from pathlib import Path
+import json, tempfile, threading, tracemalloc
+from project import Project
+import tracing
+
+sample = Path(__file__).parent / '..' / 'sample'
+
+class TestTracer(TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = Path(self.tmp.name)
+        self.tracer = tracing.install(tracing.Tracer(self.path / 'profiles'))
+
+    def tearDown(self):
+        tracing.install(tracing.NullTracer())
+        self.tmp.cleanup()
+
+    def test_stages(self):
+        """Nested stages are recorded with timings, peak memory of an inner stage
+        counts towards the outer one and only the outer stage is profiled"""
+        with tracing.stage('outer', project='x'):
+            with tracing.stage('inner') as args:
+                data = bytearray(4 * 2**20)
+                args['size'] = len(data)
+                del data
+        inner, outer = self.tracer.events
+        self.assertEqual((inner['name'], outer['name']), ('inner', 'outer'))
+        self.assertEqual(inner['args']['size'], 4 * 2**20)
+        self.assertEqual(outer['args']['project'], 'x')
+        self.assertGreaterEqual(inner['args']['peak_memory'], 4 * 2**20)
+        self.assertGreaterEqual(outer['args']['peak_memory'], inner['args']['peak_memory'])
+        self.assertGreaterEqual(outer['dur'], inner['dur'])
+        self.assertEqual([p.name.split('-', 2)[2] for p in (self.path / 'profiles').iterdir()], ['outer.prof'])
+
+    def test_threads(self):
+        """Stages on other threads record thread CPU time and no memory"""
+        with tracing.stage('compile'):
+            def work():
+                with tracing.stage('pdflatex', file='a.tex'):
+                    pass
+            thread = threading.Thread(target=work)
+            thread.start()
+            thread.join()
+        pdflatex, compile = self.tracer.events
+        self.assertNotEqual(pdflatex['tid'], compile['tid'])
+        self.assertNotIn('peak_memory', pdflatex['args'])
+        self.assertIn('children_cpu', compile['args'])
+
+    def test_project(self):
+        """Loading a project records its stages, saved as a Chrome trace"""
+        Project(sample).load()
+        names = [event['name'] for event in self.tracer.events]
+        self.assertEqual(names, ['config', 'read_texts', 'site', 'buildings', 'subplots', 'lot'])
+        self.tracer.save(self.path / 'trace.json')
+        trace = json.loads((self.path / 'trace.json').read_text())
+        self.assertEqual(len(trace['traceEvents']), 6)
+        self.assertTrue(all(event['ph'] == 'X' for event in trace['traceEvents']))
+
+    def test_tracemalloc(self):
+        """tracemalloc is stopped when the tracer which started it is replaced"""
+        self.assertTrue(tracemalloc.is_tracing())
+        tracing.Tracer().close()
+        self.assertTrue(tracemalloc.is_tracing())
+        tracing.install(tracing.NullTracer())
+        self.assertFalse(tracemalloc.is_tracing())
+
+
+if __name__ == '__main__':
+    main()
@@ -1,9 +1,15 @@
-from collections import namedtuple
+from collections import defaultdict, namedtuple
+from collections.abc import Mapping
 from argparse import ArgumentParser
 from configparser import ConfigParser
-from subprocess import run
+from concurrent.futures import ThreadPoolExecutor
+from subprocess import run, PIPE, STDOUT, DEVNULL
+import errno
 from pathlib import Path
-import logging
+from cache import default_cache_dir, digest
+from combine import combine, split_preamble, begin_document, end_document
+from pdfsplit import PdfReader, merge
+import codecs, logging, mmap, os, re, shutil, tempfile, tracing
 
 logger = logging.getLogger(__name__)
 
@@ -12,14 +18,26 @@ class ProjectInfo:
     Class contains processed information extracted from the project's configuration file.
     Load ini file, process the subdicts and assign it to self using named tuples.
     Process buildings and create relations dictionary.
+    Relations keys are a subplot id, a range (1-20) or a list (21,23,25) of both.
+    Relations may also be given in a tab separated file in the schedules folder,
+    named by relacoes in misc, one key and its models per line.
     """
     def __init__(self, ini_file):
         self.path = ini_file
         self._config = ConfigParser()
-        self._config.read(self.path)
+        try:
+            data = Path(self.path).read_bytes()
+        except FileNotFoundError:
+            raise FileNotFoundError(f'Missing configuration file {self.path}')
+        self.digest = digest(data)
+        text, items = split_section(data.decode(), 'relations')
+        self._config.read_string(text, str(self.path))
         self.project = self.parse_project()
         self.misc = self.parse_misc()
         self.topografico = self.parse_topografico()
+        self.levels = self.parse_levels()
+        self.relations_file = self._config.get('misc', 'relacoes', fallback=None)
+        self.relation_models = self.parse_relations(items, Path(self.path).name)
         self.relations = {}
        
     def attr_factory(self, translation_dict, values_dict):
@@ -57,68 +75,485 @@ class ProjectInfo:
         except KeyError as e:
             raise KeyError('Missing field from field misc in config file')
         return self.attr_factory(translation, d)
+
+    def parse_levels(self):
+        """Optional explicit story order, one story name per line of pavimentos in misc"""
+        levels = self._config.get('misc', 'pavimentos', fallback='')
+        return [line.strip() for line in levels.splitlines() if line.strip()]
         
-    def build_relations(self, buildings):
+    def parse_relations(self, items, source, relations=None):
+        """Expand items, (key, models) pairs, into dict mapping subplot id to list of
+        model names, added to relations if given. Raise ValueError on malformed keys,
+        ids given twice and unknown models, all found in a single pass"""
+        relations = {} if relations is None else relations
+        known = {*self.misc.files, 'null'}
+        errors = []
+        for key, models in items:
+            models = models.split()
+            try:
+                ids = parse_ids(key)
+            except ValueError:
+                errors.append(f'malformed subplot ids {key!r}')
+                continue
+            errors.extend(f'unknown model {model} for {key}' for model in models if model not in known)
+            for id in ids:
+                if id in relations:
+                    errors.append(f'subplot {id} related twice')
+                relations[id] = models
+        if errors:
+            raise ValueError('Invalid relations in {}: {}'.format(source, '; '.join(errors)))
+        return relations
+
+    def build_relations(self, buildings, text=None):
         """Produces ictionary with subplot id as key and list of buildings as value.
-        Used in subplot factory to assign the correct building to each subplot."""
-        relations = {int(id) : models.split() for id, models in self._config['relations'].items()}
+        Used in subplot factory to assign the correct building to each subplot.
+        text is the relations file, if the project has one"""
+        relations = self.relation_models
+        if text is not None:
+            relations = self.parse_relations(relation_items(text), self.relations_file, dict(relations))
         buildings_dict = {building.model : building for building in buildings}
         self.relations = {id : [buildings_dict[model] for model in models] for id, models in relations.items()}
 
+    def schedule_files(self):
+        """Names of the schedule files the project reads"""
+        names = [f'{model}.txt' for model in self.misc.files] + ['subplots.txt', 'area_perm.txt', 'topografico.txt']
+        return names + [self.relations_file] * bool(self.relations_file)
+
+section_re = re.compile(r'\[(?P<name>[^\]]+)\]')
+option_re = re.compile(r'(?P<key>[^=:]*)[=:](?P<value>.*)')
+
+def split_section(text, name):
+    """Split config text into the text of every other section and a list of (key, value)
+    for each option of section name, repeated keys included, which ConfigParser rejects"""
+    rest, items, inside = [], [], False
+    for line in text.splitlines(keepends=True):
+        header = section_re.match(line)
+        if header:
+            inside = header['name'].strip() == name
+            if inside:
+                continue
+        if not inside:
+            rest.append(line)
+            continue
+        stripped = line.strip()
+        if not stripped or stripped[0] in '#;':
+            continue
+        if line[0].isspace() and items:
+            key, value = items[-1]
+            items[-1] = (key, value + ' ' + stripped)
+            continue
+        option = option_re.match(stripped)
+        items.append((option['key'].strip(), option['value']) if option else (stripped, ''))
+    return ''.join(rest), items
+
+def parse_ids(key):
+    """Return list of the subplot ids in key, e.g. '7', '1-20' or '21,23,25-27'"""
+    ids = []
+    for part in key.split(','):
+        first, dash, last = part.partition('-')
+        first = int(first)
+        last = int(last) if dash else first
+        if last < first:
+            raise ValueError(f'Empty range {part}')
+        ids.extend(range(first, last + 1))
+    return ids
+
+def relation_items(text):
+    """Yield (key, models) for each line of a tab separated relations file.
+    Blank lines and lines starting with # are skipped"""
+    for line in text.splitlines():
+        line = line.strip()
+        if line and not line.startswith('#'):
+            key, _, models = line.partition('\t')
+            yield key.strip(), models
+
    
 def parse_arguments():
     parser = ArgumentParser()
-    parser.add_argument('directory', default='.', help='Root directory of project. Must follow the expected folder structure')
+    parser.add_argument('directory', nargs='*',
+                        help='Root directory of project. Must follow the expected folder structure. '
+                        'More than one directory runs in batch mode')
+    parser.add_argument('--manifest', type=Path,
+                        help='File listing project root directories, one per line. Runs in batch mode')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(),
+                        help='Number of projects published concurrently in batch mode. Defaults to the number of CPUs')
+    parser.add_argument('--summary', type=Path, help='Write the batch summary as JSON to this file')
+    parser.add_argument('--all', action='store_true',
+                        help='Rebuild every table, not only those whose inputs changed since the last run')
+    parser.add_argument('--plan', action='store_true',
+                        help='Print which tables would be rebuilt and why, without building anything')
+    parser.add_argument('--watch', action='store_true',
+                        help='Keep running and publish again whenever schedules or config.ini change')
+    parser.add_argument('--debounce', type=float, default=1.0,
+                        help='Seconds without further changes before watch mode publishes again')
+    parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count(),
+                        help='Number of pdflatex processes to run concurrently. Defaults to the number of CPUs')
+    parser.add_argument('--cache-dir', type=Path, default=default_cache_dir,
+                        help='Directory of the compiled pdf cache, may be shared between projects')
+    parser.add_argument('--cache-size', type=int, default=512,
+                        help='Maximum size of the pdf cache in MiB')
+    parser.add_argument('--no-cache', action='store_true', help='Always run pdflatex, ignoring the cache')
+    parser.add_argument('--combined', action='store_true',
+                        help='Compile tables sharing a preamble as a single document and split it into a pdf per table')
+    parser.add_argument('--async', dest='use_async', action='store_true',
+                        help='Compile each table as soon as its inputs are computed, overlapping '
+                        'parsing, rendering and pdflatex. Ignores --combined')
+    parser.add_argument('--format', choices=['json', 'csv'],
+                        help='Write the lot and subplot stats in this format instead of publishing tables. '
+                        'Never runs pdflatex')
+    parser.add_argument('-o', '--output', type=Path,
+                        help='File the stats are written to, standard output if not given')
+    parser.add_argument('--snapshot', type=Path,
+                        help='Save the values of every table of the project to this file, a base for --diff')
+    parser.add_argument('--diff', type=Path, metavar='BASE',
+                        help='Print only the values that changed since BASE, another copy of the project '
+                        'or a file saved with --snapshot, and the tables they appear in. Exits with status 1 '
+                        'if anything changed, 2 if either revision can\'t be read')
+    parser.add_argument('--trace', type=Path,
+                        help='Write wall time, CPU time and peak memory of each stage and pdflatex run '
+                        'to this file in the Chrome trace format')
+    parser.add_argument('--profile', type=Path,
+                        help='Dump cProfile stats of each stage to this directory')
     return parser.parse_args()
 
-def read_texts(path):
-    """Iterate over path, read all files with .txt in their name, remove
-    bytes that equal 0xa0, convert to string and return texts dict
-    where key is file name and value is the processed string."""
-    texts = {}
-    files = [p for p in path.iterdir() if '.txt' in p.name]
-    for f in files:
-        bs = bytes([b for b in f.read_bytes() if b != 0xa0 and b != 0x0d])
-        texts[f.name] = bs.decode(encoding='utf8')
-    return texts
+mmap_threshold = 2**20
+strip_table = str.maketrans('', '', '\r\xa0\udca0')
+stray_bytes = re.compile('[\udc80-\udcff]')
+
+def normalize(data):
+    """Decode data (bytes or any buffer) as utf8 and remove carriage returns and
+    non breaking spaces. Archicad exports non breaking spaces either as utf8 or as
+    a lone 0xa0 byte, both are removed. Any other byte which is not valid utf8 is
+    taken as latin-1."""
+    text, _ = codecs.utf_8_decode(data, 'surrogateescape', True)
+    text = text.translate(strip_table)
+    if stray_bytes.search(text):
+        text = stray_bytes.sub(lambda m: chr(ord(m.group()) - 0xdc00), text)
+    return text
+
+def read_text(path):
+    """Read and normalize the schedule at path. Large files are read through mmap"""
+    return read_schedule(path)[0]
+
+def read_schedule(path):
+    """Read the schedule at path. Return its normalized text and the digest of
+    the bytes it was read from. Large files are read through mmap"""
+    with path.open('rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        if size < mmap_threshold:
+            data = f.read()
+            return normalize(data), digest(data)
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as m:
+            return normalize(m), digest(m)
+
+class Schedules(Mapping):
+    """
+    Read only dict of schedule file name to its normalized text.
+    Only files in names are available and each one is read on first access.
+    digests maps the name of each file read to the digest of the bytes read.
+    """
+    def __init__(self, path, names):
+        self.path = path
+        self.names = list(dict.fromkeys(names))
+        self.digests = {}
+        self._texts = {}
+
+    def __repr__(self):
+        s = '{}: path={}; names={}; loaded={};'
+        return s.format(self.__class__, self.path, self.names, list(self._texts))
+
+    def __getitem__(self, name):
+        try:
+            return self._texts[name]
+        except KeyError:
+            if name not in self.names:
+                raise
+        logger.debug('Reading {}'.format(name))
+        text, self.digests[name] = read_schedule(self.path / name)
+        self._texts[name] = text
+        return text
+
+    def invalidate(self, names):
+        """Forget the text of names, they are read again on next access"""
+        for name in names:
+            self._texts.pop(name, None)
+            self.digests.pop(name, None)
+
+    def __iter__(self):
+        return iter(self.names)
+
+    def __len__(self):
+        return len(self.names)
+
+def read_texts(path, names=None):
+    """Return Schedules mapping file name to processed text for every file in names.
+    If names is None, every file in path with .txt in its name is available.
+    Files are only read when accessed."""
+    if names is None:
+        names = sorted(p.name for p in path.iterdir() if '.txt' in p.name)
+    return Schedules(path, names)
+
+def scratch_root():
+    """Return directory for scratch files, tmpfs if available"""
+    shm = Path('/dev/shm')
+    if shm.is_dir() and os.access(shm, os.W_OK | os.X_OK):
+        return shm
+    return Path(tempfile.gettempdir())
+
+class Stage:
+    """
+    Private scratch directory in which a run writes and compiles its tables.
+    Finished pdfs are only moved into out_path by publish, each one renamed
+    into place atomically, so concurrent runs never see each other's files.
+    Stage is a context manager, the scratch directory is removed on exit.
+    """
+    def __init__(self, out_path):
+        self.out_path = out_path
+        self.path = Path(tempfile.mkdtemp(prefix='unscheduler-', dir=scratch_root()))
+        logger.info(repr(self))
+
+    def __repr__(self):
+        s = '{}: path={}; out_path={};'
+        return s.format(self.__class__, self.path, self.out_path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.clean()
+
+    def publish(self):
+        """Move every pdf in the stage to out_path. Return list of published names"""
+        self.out_path.mkdir(parents=True, exist_ok=True)
+        published = []
+        for pdf in sorted(self.path.glob('*.pdf')):
+            target = self.out_path / pdf.name
+            try:
+                os.replace(pdf, target)
+            except OSError as e:
+                if e.errno != errno.EXDEV:
+                    raise
+                fd, tmp = tempfile.mkstemp(prefix='.{}-'.format(pdf.stem), dir=self.out_path)
+                os.close(fd)
+                shutil.copyfile(pdf, tmp)
+                os.replace(tmp, target)
+            logger.debug('Published {}'.format(pdf.name))
+            published.append(pdf.name)
+        return published
+
+    def clean(self):
+        """Remove the scratch directory and everything in it"""
+        logger.info('Stage, CLEAN!')
+        shutil.rmtree(self.path, ignore_errors=True)
+
+
+part_re = re.compile(r'^(.+)\.part-\d+\.tex$')
 
 class Charlie():
     """
-    Charlie works
+    Charlie works. Compiles the .tex files in work_dir into out_path
+    running up to jobs pdflatex processes at a time.
+    If cache (a BuildCache) is given, files whose source was already
+    compiled are copied from it and pdflatex is not run for them.
+    If combined is set, files sharing a preamble are compiled together in
+    a single document which is then split into a pdf per file.
+    With a cache, documents are compiled against a precompiled format of
+    their preamble, kept in cache.formats.
     """
+    engine = 'pdflatex'
+
     @classmethod
-    def do(cls, work_dir, out_path):
+    def do(cls, work_dir, out_path, jobs=None, cache=None, combined=False):
         """Wrapper method for Charlie, work_dir is a Path object with tex files,
-        out_path is a Path with the destination of the pdf files"""
-        charlie = cls(work_dir, out_path)
-        charlie.pdfy()
-        charlie.clean()
+        out_path is a Path with the destination of the pdf files.
+        Return dict with the exit status of each compiled file"""
+        charlie = cls(work_dir, out_path, jobs, cache, combined)
+        statuses = charlie.pdfy()
+        if cache:
+            cache.prune()
+        return statuses
         
-    def __init__(self, work_dir, out_path):
+    def __init__(self, work_dir, out_path, jobs=None, cache=None, combined=False):
         self.work_dir = work_dir
         self.out_path = out_path
+        self.jobs = jobs or os.cpu_count() or 1
+        self.cache = cache
+        self.combined = combined
+        self._keys = {}
         logger.info(repr(self))
 
     def __repr__(self):
-        s = '{}: work_dir={}; out_path={};'
-        return s.format(self.__class__, self.work_dir, self.out_path)
+        s = '{}: work_dir={}; out_path={}; jobs={}; cache={}; combined={};'
+        return s.format(self.__class__, self.work_dir, self.out_path, self.jobs, self.cache, self.combined)
         
-    def clean(self):
-        """Remove all .aux, .log and .tex files from work_dir and out_path"""
-        logger.info('Charlie, CLEAN!')
-        rm_suffixes = '.aux .log .tex'.split()
-        kill_list = [p for p in self.out_path.iterdir() if p.suffix in rm_suffixes]
-        kill_list_2 = [p for p in self.work_dir.iterdir() if p.suffix in rm_suffixes]
-        for path in kill_list + kill_list_2:
-            command = ['rm', str(path.absolute())]
-            logger.debug('Removing {}'.format(path.name))
-            run(command)
-            
     def pdfy(self):
-        """Run pdflatex on every .tex file in work_dir, send outputs to out_path"""
+        """Run pdflatex on every .tex file in work_dir, up to self.jobs files at a time,
+        send outputs to out_path. Return dict mapping each .tex file name to the
+        exit status of its pdflatex run. Failures are logged as errors."""
         logger.info('Charlie, PDFY!')
-        targets = [path for path in self.work_dir.iterdir() if path.suffix == '.tex']
-        for path in targets:
-            command = ['pdflatex', '-output-directory', str(self.out_path.absolute()), str(path.absolute())]
-            logger.debug('Converting {}'.format(path.name))
-            run(command)
+        targets = sorted(path for path in self.work_dir.iterdir() if path.suffix == '.tex')
+        statuses = {path.name : 0 for path in targets if self.fetch(path)}
+        pending = [path for path in targets if path.name not in statuses]
+        # shards are merged back into one pdf, so they're never combined and split
+        groups = combine([path for path in pending if not part_re.match(path.name)]) if self.combined else []
+        grouped = {path for group in groups for path in group.paths}
+        singles = [path for path in pending if path not in grouped]
+        with ThreadPoolExecutor(max_workers=self.jobs) as pool:
+            futures = [pool.submit(self.compile_combined, group) for group in groups]
+            futures += [pool.submit(lambda path : {path.name : self.compile(path)}, path) for path in singles]
+            for future in futures:
+                statuses.update(future.result())
+        statuses = self.merge_parts(statuses)
+        for name, status in statuses.items():
+            if status:
+                logger.error('pdflatex failed for {} with exit status {}'.format(name, status))
+        return statuses
+
+    def merge_parts(self, statuses):
+        """Merge the pdfs of the shards in statuses, files named <stem>.part-NNN.tex,
+        into <stem>.pdf and remove them. Return statuses, sorted by name, with the
+        shards replaced by <stem>.tex, whose status is that of its first failed shard"""
+        merged, groups = {}, defaultdict(list)
+        for name, status in statuses.items():
+            match = part_re.match(name)
+            if match:
+                groups[match.group(1)].append((name, status))
+            else:
+                merged[name] = status
+        for stem, parts in groups.items():
+            pdfs = [self.out_path / (name[:-len('.tex')] + '.pdf') for name, _ in sorted(parts)]
+            status = next((status for _, status in sorted(parts) if status), 0)
+            if not status:
+                try:
+                    readers = [PdfReader(pdf.read_bytes()) for pdf in pdfs]
+                    data = merge([(reader, range(len(reader.pages))) for reader in readers])
+                    (self.out_path / (stem + '.pdf')).write_bytes(data)
+                except (OSError, ValueError, KeyError) as e:
+                    logger.error('Could not merge the shards of {}: {}'.format(stem, e))
+                    status = 1
+            for pdf in pdfs:
+                pdf.unlink(missing_ok=True)
+            merged[stem + '.tex'] = status
+        return dict(sorted(merged.items()))
+
+    def key(self, path):
+        """Cache key of the .tex file at path"""
+        try:
+            return self._keys[path]
+        except KeyError:
+            key = self._keys[path] = self.cache.key(path.read_bytes())
+            return key
+
+    def fetch(self, path):
+        """Copy the cached pdf of path to out_path. Return True on hit"""
+        if self.cache and self.cache.fetch(self.key(path), self.out_path / (path.stem + '.pdf')):
+            logger.debug('Reusing cached pdf for {}'.format(path.name))
+            return True
+        return False
+
+    def run_engine(self, path, job_dir):
+        """Run pdflatex on path with outputs going to job_dir, trying each of
+        attempts until one succeeds. Return CompletedProcess of the last run"""
+        for options, source in self.attempts(path, job_dir):
+            result = self.run_command(path, options, source, job_dir)
+            if result.returncode == 0:
+                break
+        return result
+
+    def attempts(self, path, job_dir):
+        """Yield (options, source) for each way of compiling path, in order: the body
+        against the format of its preamble, if there's one, and the whole document.
+        Resume only if the previous attempt failed. A format which fails is marked
+        so in the FormatCache and not tried again"""
+        prepared = self.format_for(path)
+        if prepared:
+            fmt, body = prepared
+            source = job_dir / (path.stem + '-body.tex')
+            source.write_text(body)
+            yield ['-jobname=' + path.stem, '-fmt=' + str(fmt)], source
+            logger.debug('Compiling {} against {} failed, retrying without it'.format(path.name, fmt.name))
+            self.cache.formats.mark_failed(fmt)
+            (job_dir / (path.stem + '.aux')).unlink(missing_ok=True)
+        yield [], path
+
+    def command(self, options, source, job_dir):
+        return [self.engine, '-interaction=nonstopmode', '-halt-on-error', *options,
+                '-output-directory', str(job_dir), str(source.absolute())]
+
+    def run_command(self, path, options, source, job_dir):
+        logger.debug('Converting {}'.format(path.name))
+        fmt = any(option.startswith('-fmt=') for option in options)
+        with tracing.stage('pdflatex', file=path.name, format=fmt) as args:
+            result = run(self.command(options, source, job_dir), stdin=DEVNULL, stdout=PIPE, stderr=STDOUT)
+            args['status'] = result.returncode
+        self.report(path, result.returncode, result.stdout)
+        return result
+
+    @staticmethod
+    def report(path, returncode, output):
+        """Log the tail of pdflatex's output for path if it failed"""
+        if returncode:
+            tail = output.decode(errors='replace').splitlines()[-20:]
+            logger.debug('pdflatex output for {}:\n{}'.format(path.name, '\n'.join(tail)))
+
+    def format_for(self, path):
+        """Return (format Path, body-only document) for the .tex file at path or
+        None if there's no format for its preamble"""
+        formats = getattr(self.cache, 'formats', None)
+        if formats is None:
+            return None
+        try:
+            preamble, body = split_preamble(path.read_text())
+        except ValueError:
+            return None
+        fmt = formats.format_for(preamble)
+        return fmt and (fmt, begin_document + body + end_document + '\n')
+
+    def job_dir(self, path):
+        """Return a new private directory for the job compiling path"""
+        return Path(tempfile.mkdtemp(prefix='.{}-'.format(path.stem), dir=self.out_path))
+
+    def collect(self, path, job_dir, returncode):
+        """Cache the pdf the job compiling path left in job_dir and move it into out_path"""
+        pdf = job_dir / (path.stem + '.pdf')
+        if returncode == 0 and pdf.exists():
+            if self.cache:
+                self.cache.put(self.key(path), pdf)
+            pdf.replace(self.out_path / pdf.name)
+
+    def compile(self, path):
+        """Compile a single .tex file. The job runs in a private directory so that
+        its .aux and .log files never clash with other jobs, only the resulting pdf
+        is moved into out_path. Return pdflatex's exit status"""
+        job_dir = self.job_dir(path)
+        try:
+            result = self.run_engine(path, job_dir)
+            self.collect(path, job_dir, result.returncode)
+            return result.returncode
+        finally:
+            shutil.rmtree(job_dir, ignore_errors=True)
+
+    def compile_combined(self, group):
+        """Compile group, a Combined document, in a single run and split the result
+        into a pdf per part. Parts are compiled one by one if that fails.
+        Return dict mapping the name of each part to its exit status"""
+        job_dir = Path(tempfile.mkdtemp(prefix='.{}-'.format(group.jobname), dir=self.out_path))
+        try:
+            source = job_dir / (group.jobname + '.tex')
+            source.write_text(group.source())
+            result = self.run_engine(source, job_dir)
+            if result.returncode == 0:
+                reader = PdfReader((job_dir / (group.jobname + '.pdf')).read_bytes())
+                ranges = group.page_ranges((job_dir / (group.jobname + '.pages')).read_text())
+                for path, pages in zip(group.paths, ranges):
+                    pdf = self.out_path / (path.stem + '.pdf')
+                    pdf.write_bytes(reader.extract(pages))
+                    if self.cache:
+                        self.cache.put(self.key(path), pdf)
+                return {path.name : 0 for path in group.paths}
+            logger.warning('Combined compile of {} failed with exit status {}'.format(group, result.returncode))
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning('Could not split combined document {}: {}'.format(group, e))
+        finally:
+            shutil.rmtree(job_dir, ignore_errors=True)
+        return {path.name : self.compile(path) for path in group.paths}
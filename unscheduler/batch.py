@@ -0,0 +1,68 @@
+"""
+Module disposes of batch mode, which publishes many projects in one
+invocation across a pool of worker processes.
+"""
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from pathlib import Path
+from cache import engine_version, templates_version
+from project import publish
+import json, logging, time, tracing
+
+logger = logging.getLogger(__name__)
+
+def read_manifest(path):
+    """Return list of project roots listed in the manifest at path, one per line.
+    Blank lines and lines starting with # are ignored, relative roots are
+    relative to the manifest's directory"""
+    path = Path(path)
+    roots = []
+    for line in path.read_text().splitlines():
+        line = line.strip()
+        if line and not line.startswith('#'):
+            roots.append(path.parent / line)
+    return roots
+
+def init_worker(engine):
+    """Warm template and engine information once per worker process"""
+    templates_version()
+    engine_version(engine)
+
+def run_project(root, args):
+    """Publish a single project, never raises. Return dict summarizing the result.
+    If tracing, the events recorded for the project are returned under 'trace'"""
+    start = time.perf_counter()
+    result = dict(project=str(root), status='ok', failed=[], error=None)
+    tracer = tracing.install(tracing.Tracer(args.profile)) if args.trace or args.profile else None
+    try:
+        with tracing.stage('project', project=str(root)):
+            result['failed'] = publish(root, args)
+        if result['failed']:
+            result['status'] = 'failed'
+    except Exception as e:
+        logger.exception('Error publishing {}'.format(root))
+        result['status'] = 'error'
+        result['error'] = '{}: {}'.format(type(e).__name__, e)
+    finally:
+        if tracer:
+            tracing.install(tracing.NullTracer())
+            result['trace'] = tracer.events
+    result['seconds'] = round(time.perf_counter() - start, 3)
+    return result
+
+def run_batch(roots, args, engine='pdflatex'):
+    """Publish every project in roots using args.workers processes.
+    Return list of per project summaries, in the order of roots"""
+    logger.info('Batch of {} projects on {} workers'.format(len(roots), args.workers))
+    with ProcessPoolExecutor(max_workers=args.workers, initializer=init_worker, initargs=(engine,)) as pool:
+        return list(pool.map(partial(run_project, args=args), roots))
+
+def write_summary(results, f, summary_path=None):
+    """Write a line per project to f and, if summary_path is given, the full
+    summary as JSON to summary_path"""
+    for result in results:
+        detail = result['error'] or ', '.join(result['failed'])
+        f.write('{:<6} {:>8.2f}s {} {}\n'.format(result['status'], result['seconds'], result['project'], detail).rstrip() + '\n')
+    if summary_path:
+        with Path(summary_path).open('w') as out:
+            json.dump(results, out, indent=2)
@@ -1,7 +1,7 @@
 """ 
 The module contains memes.
 """
-import logging
+import logging, sys
 import tables
 
 logger = logging.getLogger(__name__)
@@ -9,42 +9,64 @@ logger = logging.getLogger(__name__)
 class Building():
     """
     A building is a named collection of stories.
+    Buildings use __slots__, an instance takes at most 96 bytes on top of
+    its stories and area tuples.
     """
+    __slots__ = ('model', 'stories', 'super_story', 'areas_comp', 'areas_ncomp', 'area_proj')
     formatter = tables.BuildingFormatter()
-    def __init__(self, model, stories):
+    def __init__(self, model, stories, area_proj=None):
         self.model = model
-        self.stories = stories
+        self.stories = tuple(stories)
         self.super_story = None
-        acs = [story.area_comp for story in self.stories]
-        ncs = [story.area_ncomp for story in self.stories]
-        self.super_story = Story(-1, 'TOTAL', sum(acs), sum(ncs))
-        self.area_proj = max(acs)
-        logger.info(repr(self))
-        logger.debug('Building from stories={}'.format(stories))
+        self.areas_comp = tuple(story.area_comp for story in self.stories)
+        self.areas_ncomp = tuple(story.area_ncomp for story in self.stories)
+        self.super_story = Story(-1, 'TOTAL', sum(self.areas_comp), sum(self.areas_ncomp))
+        self.area_proj = max(self.areas_comp) if area_proj is None else area_proj
+        logger.debug('%r', self)
 
     @classmethod
     def get_null_building(cls):
         return cls('null', [Story.null_story()])
 
     @classmethod
-    def get_super_building(cls, model, buildings):
+    def get_super_building(cls, model, buildings, index=None):
         """Super building return a building from a sequence of buildings as opposed
         to a sequence of stories. Super building does a per story sum of areas.
         Super building's idiosyncrasy is that area_proj instead of being the max
-        becomes the sum of the projection areas for each building"""
+        becomes the sum of the projection areas for each building.
+        Stories are joined by name through index, usually the project's StoryIndex,
+        and ordered as in index. Without one, an index of buildings is used. The null building's story only shows
+        when it is the sole member"""
         if not buildings:
             return cls.get_null_building()
-        tallest_building = sorted(buildings, key=len)[-1]
-        story_names = [story.name for story in tallest_building.stories]
+        index = index or StoryIndex(buildings)
         total_area_proj = sum(building.area_proj for building in buildings)
-        stories = []
-        for i, name in enumerate(story_names):
-            ac = sum(building[i].area_comp for building in buildings)
-            nc = sum(building[i].area_ncomp for building in buildings)
-            stories.append(Story(i, name, ac, nc))
-        new_building = cls(model, stories)
-        new_building.area_proj = total_area_proj
-        return new_building
+        acs, ncs = {}, {}
+        for building in [building for building in buildings if building.model != 'null'] or buildings:
+            for story in building.stories:
+                slot = index.slot(story.name)
+                acs[slot] = acs.get(slot, 0.0) + story.area_comp
+                ncs[slot] = ncs.get(slot, 0.0) + story.area_ncomp
+        stories = [Story(i, index.names[slot], acs[slot], ncs[slot]) for i, slot in enumerate(sorted(acs))]
+        return cls(model, stories, total_area_proj)
+
+    @classmethod
+    def get_shared_super_building(cls, buildings, index=None):
+        """Return the super building of buildings, whose stories are frozen. Its model
+        is 'super', or 'null' if every member is the null building. With an index the
+        result is memoized in it, so every land with the same buildings gets the same
+        object for as long as the project keeps its index."""
+        key = tuple(buildings)
+        if index is None:
+            return cls._shared_super_building(key, None)
+        if key not in index.super_buildings:
+            index.super_buildings[key] = cls._shared_super_building(key, index)
+        return index.super_buildings[key]
+
+    @classmethod
+    def _shared_super_building(cls, buildings, index):
+        model = 'super' if any(building.model != 'null' for building in buildings) else 'null'
+        return cls.get_super_building(model, buildings, index).freeze()
             
     @property
     def area_comp(self):
@@ -68,15 +90,25 @@ class Building():
             f.write(latex)
 
     def all_stories(self):
-        return self.stories + [self.super_story]
+        return [*self.stories, self.super_story]
+
+    def freeze(self):
+        """Replace the stories of building, TOTAL included, with frozen copies. Return building"""
+        self.stories = tuple(story.frozen() for story in self.stories)
+        self.super_story = self.super_story.frozen()
+        return self
+
+    def stories_named(self, names):
+        """Return the story of building called each of names, matched by normalized
+        name, and an empty story for the names building lacks"""
+        stories = {normalize(story.name) : story for story in self.stories}
+        return [stories.get(normalize(name)) or Story(-1, name) for name in names]
     
     def __getitem__(self, n):
         """Returns the nth Story if not present, returns an empty story"""
-        try:
-            value = self.stories[n]
-        except IndexError:
-            value = Story(n, 'out-of-range')
-        return value
+        if -len(self.stories) <= n < len(self.stories):
+            return self.stories[n]
+        return Story(n, 'out-of-range')
 
     def __len__(self):
         """ Number of stories in building """
@@ -93,25 +125,31 @@ class Story():
     Abstraction of a Story.
     A story is composed of a name, an id, net computable area and net non-computable area
     Each building has multiple stories
+    Stories use __slots__ and interned names, an instance takes at most
+    64 bytes on top of its areas.
     """
+    __slots__ = ('id', 'name', 'area_comp', 'area_ncomp')
     formatter = tables.StoryFormatter()
     def __init__(self, id, name, area_comp=0.0, area_ncomp=0.0):
         self.id = id
-        self.name = name
+        self.name = sys.intern(name)
         self.area_comp = area_comp
         self.area_ncomp = area_ncomp
-        logger.debug(repr(self))
-        
+
 
     @classmethod
     def null_story(cls):
         return Story(0, 'null')
+
+    def frozen(self):
+        """Return a FrozenStory copy of story"""
+        return FrozenStory(self.id, self.name, self.area_comp, self.area_ncomp)
     
     def add_area(self, area, category):
         """Adds given area to the matching category,
         area: float
         category: str ('NC' or 'C') """
-        logger.debug('Add area call: area={}, category={}, self={}'.format(area, category, repr(self)))
+        logger.debug('Add area call: area=%s, category=%s, self=%r', area, category, self)
         if category == 'NC':
             self.area_ncomp += area
         elif category == 'C':
@@ -135,3 +173,61 @@ class Story():
     def __repr__(self):
         s = '{}: id={}; name={}; area_comp={:.2f}; area_ncomp={:.2f};'
         return s.format(self.__class__, self.id, self.name, self.area_comp, self.area_ncomp)
+
+
+class FrozenStory(Story):
+    """
+    Story which can't be modified, held by the super buildings shared between lands.
+    """
+    __slots__ = ()
+    def __init__(self, id, name, area_comp=0.0, area_ncomp=0.0):
+        for attr, value in zip(Story.__slots__, (id, sys.intern(name), area_comp, area_ncomp)):
+            object.__setattr__(self, attr, value)
+
+    def __setattr__(self, attr, value):
+        raise AttributeError(f'{self!r} is shared and can\'t be modified')
+
+    def frozen(self):
+        return self
+
+    def add_area(self, area, category):
+        raise AttributeError(f'{self!r} is shared and can\'t be modified')
+
+
+def normalize(name):
+    """Return story name as stories are joined by, case and runs of whitespace ignored"""
+    return ' '.join(name.split()).upper()
+
+class StoryIndex:
+    """
+    Hash index of the stories of a project, mapping each story name, as exported
+    and normalized, to its slot in super buildings. Built once per project.
+    Slots follow levels, the explicit level order from config.ini, then the other
+    stories in order of appearance, taller buildings first.
+    super_buildings memoizes the shared super buildings joined through the index.
+    """
+    def __init__(self, buildings, levels=()):
+        self.names = []
+        self._slots = {}
+        self.super_buildings = {}
+        for name in levels:
+            self.slot(name)
+        for building in sorted(buildings, key=len, reverse=True):
+            for story in building.stories:
+                self.slot(story.name)
+
+    def __repr__(self):
+        s = '{}: stories={};'
+        return s.format(self.__class__, len(self.names))
+
+    def slot(self, name):
+        """Return the slot of story name, adding it after the known ones if new"""
+        try:
+            return self._slots[name]
+        except KeyError:
+            key = normalize(name)
+            if key not in self._slots:
+                self._slots[key] = len(self.names)
+                self.names.append(name)
+            slot = self._slots[name] = self._slots[key]
+            return slot
@@ -0,0 +1,247 @@
+"""
+Module disposes of on-disk caches that outlive a single run and can be
+shared between projects.
+"""
+from functools import lru_cache
+from subprocess import run, PIPE, STDOUT, DEVNULL
+from pathlib import Path
+import hashlib, logging, marshal, os, shutil, tempfile, threading, tracing
+
+logger = logging.getLogger(__name__)
+
+templates_path = Path(__file__).parent / '..' / 'templates'
+default_cache_dir = Path(os.environ.get('UNSCHEDULER_CACHE') or
+                         Path(os.environ.get('XDG_CACHE_HOME') or Path.home() / '.cache') / 'unscheduler')
+
+def digest(*parts):
+    """Return hex sha256 of parts, each part is a str or bytes. Parts are
+    length prefixed so that ('ab', 'c') and ('a', 'bc') differ"""
+    h = hashlib.sha256()
+    for part in parts:
+        if isinstance(part, str):
+            part = part.encode()
+        h.update(len(part).to_bytes(8, 'little'))
+        h.update(part)
+    return h.hexdigest()
+
+@lru_cache(maxsize=None)
+def engine_version(engine):
+    """First line of `engine --version`, empty string if engine can't be run"""
+    try:
+        result = run([engine, '--version'], stdin=DEVNULL, stdout=PIPE, stderr=DEVNULL)
+    except OSError:
+        return ''
+    lines = result.stdout.decode(errors='replace').splitlines()
+    return lines[0] if lines else ''
+
+@lru_cache(maxsize=None)
+def templates_version():
+    """Digest of every template, changes whenever a template is edited"""
+    templates = sorted(templates_path.glob('*.tex'))
+    return digest(*[p.name + p.read_text() for p in templates])
+
+
+class Store:
+    """
+    Directory of files addressed by key, capped at max_size bytes.
+    A hit refreshes the entry's mtime and prune evicts the least recently
+    used entries until the store fits max_size.
+    Entries are written to a temporary file and renamed into place so
+    concurrent runs sharing the directory never see partial files.
+    """
+    def __init__(self, path, suffix, max_size):
+        self.path = Path(path)
+        self.suffix = suffix
+        self.max_size = max_size
+        self.path.mkdir(parents=True, exist_ok=True)
+
+    def __repr__(self):
+        s = '{}: path={}; max_size={};'
+        return s.format(self.__class__, self.path, self.max_size)
+
+    def path_for(self, key):
+        return self.path / key[:2] / (key + self.suffix)
+
+    def get(self, key):
+        """Return Path of the entry for key or None if there's no such entry"""
+        path = self.path_for(key)
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return path
+
+    def put_bytes(self, key, data):
+        """Store data under key and return the entry's Path"""
+        target = self.path_for(key)
+        target.parent.mkdir(exist_ok=True)
+        fd, tmp = tempfile.mkstemp(prefix='.tmp-', dir=target.parent)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp, target)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+        return target
+
+    def put(self, key, source):
+        """Copy file at source into the store under key and return the entry's Path"""
+        return self.put_bytes(key, Path(source).read_bytes())
+
+    def prune(self):
+        """Evict least recently used entries until the store fits max_size"""
+        entries = []
+        for path in self.path.glob('*/*' + self.suffix):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        size = sum(entry[1] for entry in entries)
+        for mtime, entry_size, path in sorted(entries):
+            if size <= self.max_size:
+                break
+            logger.debug('Evicting {}'.format(path.name))
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                pass
+            size -= entry_size
+
+
+class BuildCache(Store):
+    """
+    Cache of compiled pdfs keyed by the digest of the LaTeX source,
+    the templates and the version of the engine that compiled it.
+    formats is the FormatCache of the preambles and tables the TableCache of
+    the parsed schedules, both stored alongside.
+    """
+    def __init__(self, path=default_cache_dir, max_size=512 * 2**20, engine='pdflatex'):
+        super().__init__(Path(path) / 'pdf', '.pdf', max_size)
+        self.engine = engine
+        self.formats = FormatCache(path, engine=engine)
+        self.tables = TableCache(path)
+
+    def key(self, source):
+        """Return the cache key for source, the text of a .tex file"""
+        return digest(source, templates_version(), engine_version(self.engine))
+
+    def fetch(self, key, target):
+        """Copy the cached pdf for key to target. Return True on hit"""
+        cached = self.get(key)
+        if cached is None:
+            return False
+        try:
+            shutil.copyfile(cached, target)
+        except FileNotFoundError:
+            return False
+        return True
+
+    def prune(self):
+        super().prune()
+        self.formats.prune()
+        self.tables.prune()
+
+
+class FormatCache(Store):
+    """
+    Cache of TeX formats with a document preamble preloaded, keyed by the digest
+    of the preamble and the version of the engine that dumped it. Documents
+    compiled against the format skip loading their class and packages.
+    Each preamble is dumped at most once per run, if dumping fails the preamble
+    is remembered and its documents are compiled as they are. So are those of a
+    format marked failed, which is remembered on disk for later runs.
+    """
+    def __init__(self, path=default_cache_dir, max_size=128 * 2**20, engine='pdflatex'):
+        super().__init__(Path(path) / 'fmt', '.fmt', max_size)
+        self.engine = engine
+        self._formats = {}
+        self._locks = {}
+        self._lock = threading.Lock()
+
+    def key(self, preamble):
+        """Return the cache key for preamble"""
+        return digest(preamble, engine_version(self.engine))
+
+    def _lock_for(self, key):
+        """Return the lock of the format for key"""
+        with self._lock:
+            return self._locks.setdefault(key, threading.Lock())
+
+    def failed_path(self, key):
+        return self.path_for(key).with_suffix('.failed')
+
+    def format_for(self, preamble):
+        """Return Path of the format for preamble, dumping it first if it's not
+        cached. Return None if preamble can't be dumped or its format is marked failed"""
+        key = self.key(preamble)
+        with self._lock_for(key):
+            if key not in self._formats:
+                failed = self.failed_path(key).exists()
+                self._formats[key] = None if failed else self.get(key) or self.dump(preamble, key)
+            return self._formats[key]
+
+    def mark_failed(self, fmt):
+        """Remember that compiling against fmt, a Path returned by format_for, failed.
+        format_for returns None for its preamble from now on, in later runs too"""
+        key = Path(fmt).stem
+        with self._lock_for(key):
+            logger.warning('Format {} failed, its documents are compiled as they are'.format(key))
+            self._formats[key] = None
+            marker = self.failed_path(key)
+            marker.parent.mkdir(exist_ok=True)
+            marker.touch()
+
+    def dump(self, preamble, key):
+        """Run the engine in ini mode over preamble and store the resulting format
+        under key. Return the entry's Path or None on failure"""
+        job_dir = Path(tempfile.mkdtemp(prefix='unscheduler-fmt-'))
+        try:
+            source = job_dir / (key + '.tex')
+            source.write_text(preamble + '\n\\dump\n')
+            command = [self.engine, '-ini', '-interaction=nonstopmode', '-halt-on-error',
+                       '-jobname=' + key, '-output-directory', str(job_dir),
+                       '&' + Path(self.engine).name, str(source)]
+            logger.debug('Dumping format {}'.format(key))
+            try:
+                with tracing.stage('dump_format', key=key[:12]):
+                    result = run(command, stdin=DEVNULL, stdout=PIPE, stderr=STDOUT)
+            except OSError as e:
+                logger.warning('Could not run {}: {}'.format(self.engine, e))
+                return None
+            fmt = job_dir / (key + '.fmt')
+            if result.returncode or not fmt.exists():
+                logger.warning('Could not dump format for preamble:\n{}'.format(preamble.strip()))
+                return None
+            return self.put(key, fmt)
+        finally:
+            shutil.rmtree(job_dir, ignore_errors=True)
+
+
+class TableCache(Store):
+    """
+    Cache of parsed schedules keyed by the digest of the schedule's normalized
+    text and the schema it's parsed with. Rows are stored with marshal, loading
+    them costs far less than parsing and casting the schedule again.
+    """
+    def __init__(self, path=default_cache_dir, max_size=64 * 2**20):
+        super().__init__(Path(path) / 'tables', '.marshal', max_size)
+
+    def key(self, text, spec, title=False, header=True):
+        """Return the cache key for text parsed with the schema spec"""
+        return digest(text, spec, '{:d}{:d}'.format(title, header), str(marshal.version))
+
+    def rows(self, text, spec, title, header, parse):
+        """Return list of the rows of text, each a tuple of cast cells. On a miss
+        rows are computed by calling parse and stored"""
+        key = self.key(text, spec, title, header)
+        cached = self.get(key)
+        if cached is not None:
+            try:
+                return marshal.loads(cached.read_bytes())
+            except (OSError, EOFError, ValueError, TypeError):
+                logger.warning('Ignoring unreadable cache entry {}'.format(cached.name))
+        rows = parse()
+        self.put_bytes(key, marshal.dumps(rows))
+        return rows
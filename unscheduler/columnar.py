@@ -0,0 +1,68 @@
+"""
+Module disposes of a columnar representation of parsed area by story schedules.
+Columns are NumPy arrays when NumPy is installed and plain lists otherwise.
+"""
+import logging
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+logger = logging.getLogger(__name__)
+
+class Columns:
+    """
+    Area by story schedule stored column wise.
+    stories - names of the distinct stories, in order of first appearance
+    story_codes - index in stories of each row's story
+    category_codes - index in categories of each row's category
+    areas - float64 area of each row
+    """
+    categories = ('C', 'NC')
+
+    def __init__(self, stories, story_codes, category_codes, areas):
+        self.stories = stories
+        self.story_codes = story_codes
+        self.category_codes = category_codes
+        self.areas = areas
+
+    def __repr__(self):
+        s = '{}: stories={}; rows={}; numpy={};'
+        return s.format(self.__class__, len(self.stories), len(self.areas), np is not None)
+
+    def __len__(self):
+        return len(self.areas)
+
+    @classmethod
+    def from_records(cls, records):
+        """Build columns from an iterable of (story, category, area) records.
+        Raise ValueError on categories other than 'C' and 'NC'"""
+        story_index = {}
+        category_index = {category : i for i, category in enumerate(cls.categories)}
+        story_codes, category_codes, areas = [], [], []
+        for story, category, area in records:
+            story_codes.append(story_index.setdefault(story, len(story_index)))
+            try:
+                category_codes.append(category_index[category])
+            except KeyError:
+                raise ValueError('Invalid category {!r} in story {!r}'.format(category, story)) from None
+            areas.append(area)
+        if np is not None:
+            story_codes = np.array(story_codes, dtype=np.intp)
+            category_codes = np.array(category_codes, dtype=np.intp)
+            areas = np.array(areas, dtype=np.float64)
+        return cls(list(story_index), story_codes, category_codes, areas)
+
+    def totals(self):
+        """Group rows by story and category. Return (area_comp, area_ncomp),
+        two lists with the summed areas of each story in stories"""
+        n = len(self.stories)
+        if np is not None:
+            keys = self.story_codes * 2 + self.category_codes
+            sums = np.bincount(keys, weights=self.areas, minlength=2 * n)
+            return sums[0::2].tolist(), sums[1::2].tolist()
+        sums = ([0.0] * n, [0.0] * n)
+        for story, category, area in zip(self.story_codes, self.category_codes, self.areas):
+            sums[category][story] += area
+        return sums
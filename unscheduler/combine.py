@@ -0,0 +1,83 @@
+"""
+Module disposes of combined documents, which put the tables sharing a preamble
+into a single LaTeX document so that they're compiled by a single pdflatex run.
+The compiled document is then split back into one pdf per table.
+"""
+from collections import defaultdict
+import logging
+
+logger = logging.getLogger(__name__)
+
+begin_document = '\\begin{document}'
+end_document = '\\end{document}'
+
+def split_preamble(source):
+    """Return (preamble, body) of the LaTeX document source.
+    Raise ValueError if source lacks \\begin{document} or \\end{document}"""
+    start = source.index(begin_document)
+    end = source.rindex(end_document)
+    return source[:start], source[start + len(begin_document):end]
+
+
+class Combined:
+    """
+    Document made of the bodies of documents sharing preamble, each body starting
+    on a new page numbered 1. While compiling, the number of pages shipped before
+    each body is written to <jobname>.pages, from which page_ranges recovers the
+    pages of each part.
+    """
+    jobname = 'combined'
+
+    def __init__(self, preamble, paths, bodies):
+        self.preamble = preamble
+        self.paths = paths
+        self.bodies = bodies
+
+    def __repr__(self):
+        s = '{}: parts={};'
+        return s.format(self.__class__, [path.name for path in self.paths])
+
+    def source(self):
+        """Return LaTeX source of the combined document"""
+        lines = [self.preamble.rstrip(), begin_document, '\\pdfobjcompresslevel=0',
+                 '\\newwrite\\unschedulerpages', '\\immediate\\openout\\unschedulerpages=\\jobname.pages']
+        for i, body in enumerate(self.bodies):
+            lines.append('\\clearpage\\setcounter{page}{1}')
+            lines.append('\\immediate\\write\\unschedulerpages{%d \\the\\ReadonlyShipoutCounter}' % i)
+            lines.append(body)
+        lines.append('\\clearpage')
+        lines.append('\\immediate\\write\\unschedulerpages{end \\the\\ReadonlyShipoutCounter}')
+        lines.append('\\immediate\\closeout\\unschedulerpages')
+        lines.append(end_document)
+        return '\n'.join(lines) + '\n'
+
+    def page_ranges(self, pages):
+        """From pages, the text of the .pages file, return a range of page
+        indices for each part. Raise ValueError if it doesn't match the parts"""
+        starts = {}
+        for line in pages.split('\n'):
+            if line.strip():
+                part, count = line.split()
+                starts[part] = int(count)
+        bounds = [starts[str(i)] for i in range(len(self.bodies))] + [starts['end']]
+        ranges = [range(start, end) for start, end in zip(bounds, bounds[1:])]
+        if not all(ranges):
+            raise ValueError('Part without pages in {}'.format(self))
+        return ranges
+
+
+def combine(paths):
+    """Group .tex files in paths by preamble. Return list of Combined, one for
+    each preamble shared by two or more files. Files left out are better off
+    compiled on their own"""
+    groups = defaultdict(lambda : ([], []))
+    for path in paths:
+        try:
+            preamble, body = split_preamble(path.read_text())
+        except ValueError:
+            logger.warning('{} is not a complete LaTeX document'.format(path.name))
+            continue
+        group = groups[preamble]
+        group[0].append(path)
+        group[1].append(body)
+    return [Combined(preamble, *group) for preamble, group in groups.items() if len(group[0]) > 1]
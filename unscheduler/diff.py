@@ -0,0 +1,168 @@
+"""
+Module disposes of the revision diff, which compares the values shown in the
+tables of a project against a base revision, another copy of the project or a
+snapshot saved earlier, and reports only the values that changed and the
+tables they appear in. Nothing is rendered nor compiled, and tables whose
+input files are identical in both revisions are not even computed.
+"""
+from aux import ProjectInfo
+from graph import dependencies, input_digests
+from project import Project, get_cache, table_cache
+from stats import lot_stats, number
+import json, logging, math, sys, tracing
+
+logger = logging.getLogger(__name__)
+
+site_fields = ['area_ri', 'area_real', 'area_atingida', 'area_remanescente']
+
+def story_values(building):
+    """Return dict mapping each story of building, TOTAL included, to its areas"""
+    return {story.name : dict(area_comp=story.area_comp, area_ncomp=story.area_ncomp)
+            for story in building.all_stories()}
+
+def table_values(project, name):
+    """Return the values shown by table name of the loaded project, as a dict
+    mapping each row to a dict mapping column to value"""
+    site, lot = project.site, project.lot
+    if name == 'topografico':
+        return {'site' : {key : value for key, value in lot_stats(site, lot).items() if key in site_fields}}
+    if name == 'subplot-areas':
+        return {land.name : {f'{story} {column}' : value
+                             for story, areas in story_values(land.super_building).items()
+                             for column, value in areas.items()}
+                for land in [*lot.lands, lot]}
+    if name == 'suplot-stats':
+        rows = {land.name : dict(area_proj=land.super_building.area_proj, area=land.area,
+                                 taxa_ocp=number(land.taxa_ocp), coef_aprov=number(land.coef_aprov),
+                                 area_perm=land.area_perm, taxa_perm=number(land.taxa_perm))
+                for land in lot.lands}
+        rows[lot.name] = dict(area_proj=lot.super_building.area_proj, area=lot.area, area_perm=lot.area_perm)
+        return rows
+    if name == 'lot-stats':
+        return {'lot' : {key : value for key, value in lot_stats(site, lot).items() if key != 'cm'}}
+    if name == 'tos':
+        return {'lot' : {'cm' : lot_stats(site, lot)['cm']}}
+    if name == 'null':
+        return {}
+    return story_values(project._buildings[name])
+
+def read_inputs(project):
+    """Read project's config. Return (graph, digests): the input files of each table
+    as sorted lists and the digest of every input file"""
+    project.info = ProjectInfo(project.config)
+    graph = {name : sorted(inputs) for name, inputs in dependencies(project.info).items()}
+    return graph, input_digests(project, set().union(*graph.values()))
+
+def compute_tables(project, names):
+    """Load project if names isn't empty. Return dict mapping each table in names to its values"""
+    if not names:
+        return {}
+    with tracing.stage('load'):
+        project.load()
+    with tracing.stage('snapshot', tables=len(names)):
+        return {name : table_values(project, name) for name in names}
+
+def snapshot(project):
+    """Return snapshot of project, a dict with the graph, input digests and the
+    values of every table, which diff accepts as a base"""
+    graph, digests = read_inputs(project)
+    return dict(graph=graph, inputs=digests, tables=compute_tables(project, list(graph)))
+
+def stale_tables(graph, digests, base_graph, base_digests):
+    """Return list of the tables which may differ between two revisions: those only
+    one revision has and those with an input file whose digest differs"""
+    stale = []
+    for name in {**graph, **base_graph}:
+        if name not in graph or name not in base_graph:
+            stale.append(name)
+        elif any(digests.get(n) != base_digests.get(n) for n in {*graph[name], *base_graph[name]}):
+            stale.append(name)
+    return stale
+
+def same(a, b):
+    """Whether values a and b are equal, numbers up to rounding errors"""
+    numbers = all(isinstance(x, (int, float)) and not isinstance(x, bool) for x in (a, b))
+    return math.isclose(a, b, rel_tol=1e-9, abs_tol=1e-9) if numbers else a == b
+
+def compare(base, current):
+    """Return list of (row, column, old, new) for the values of a table which differ
+    between base and current. Values missing from a revision are None"""
+    changes = []
+    for row in {**base, **current}:
+        old_row, new_row = base.get(row, {}), current.get(row, {})
+        for column in {**old_row, **new_row}:
+            old, new = old_row.get(column), new_row.get(column)
+            if not same(old, new):
+                changes.append((row, column, old, new))
+    return changes
+
+def diff(project, base):
+    """Compare project against base, a project directory or a snapshot file.
+    Return dict mapping each affected table to the list of its changed values,
+    as compare returns them, or to 'added' or 'removed'"""
+    graph, digests = read_inputs(project)
+    if base.is_dir():
+        base_project = Project(base, project.table_cache)
+        base_graph, base_digests = read_inputs(base_project)
+    else:
+        saved = json.loads(base.read_text())
+        base_graph, base_digests = saved['graph'], saved['inputs']
+    tables = stale_tables(graph, digests, base_graph, base_digests)
+    logger.info('Tables with changed inputs: {}'.format(', '.join(tables) or 'none'))
+    if base.is_dir():
+        base_values = compute_tables(base_project, [name for name in tables if name in base_graph])
+    else:
+        base_values = saved['tables']
+    values = compute_tables(project, [name for name in tables if name in graph])
+    changes = {}
+    for name in tables:
+        if name not in base_graph:
+            changes[name] = 'added'
+        elif name not in graph:
+            changes[name] = 'removed'
+        else:
+            table_changes = compare(base_values[name], values[name])
+            if table_changes:
+                changes[name] = table_changes
+    return changes
+
+def format_value(value):
+    """Return value as text, floats to at most 4 decimals"""
+    if value is None:
+        return '-'
+    if isinstance(value, float):
+        return '{:.4f}'.format(value).rstrip('0').rstrip('.')
+    return str(value)
+
+def format_diff(changes):
+    """Return changes as text, each table followed by its changed values"""
+    if not changes:
+        return 'No changes\n'
+    lines = []
+    for name, table_changes in changes.items():
+        if isinstance(table_changes, str):
+            lines.append('{}: {}'.format(name, table_changes))
+            continue
+        lines.append('{}:'.format(name))
+        for row, column, old, new in table_changes:
+            lines.append('  {} {}: {} -> {}'.format(row, column, format_value(old), format_value(new)))
+    return '\n'.join(lines) + '\n'
+
+def write_snapshot(root, args):
+    """Save the snapshot of project at root to args.snapshot"""
+    project = Project(root, table_cache(get_cache(args)))
+    args.snapshot.write_text(json.dumps(snapshot(project)) + '\n')
+
+def write_diff(root, args):
+    """Print the changes of project at root since args.diff. Return 1 if anything changed,
+    2 if either revision can't be read, else 0"""
+    project = Project(root, table_cache(get_cache(args)))
+    try:
+        if not args.diff.exists():
+            raise FileNotFoundError(f'No such file or directory {args.diff}')
+        changes = diff(project, args.diff)
+    except (OSError, ValueError, KeyError) as e:
+        print('Cannot diff {} against {}: {}'.format(root, args.diff, e), file=sys.stderr)
+        return 2
+    print(format_diff(changes), end='')
+    return int(bool(changes))
@@ -2,33 +2,93 @@
 Module disposes of factory classes/functions that return Buildings, Lots and Subplots
 from Archicad's exported schedule.
 """
-import collections, logging, re
+import collections, io, itertools, logging, re
+from functools import lru_cache
 from building import Story, Building
+from columnar import Columns
 from land import Land, Site
 
 logger = logging.getLogger(__name__)
 
+float_re = re.compile(r'^[\d,]+\.\d+$')
+int_re = re.compile(r'^\d+$')
+
 def caster(s):
     """Identify if s is a float, int or a string and cast s to its matching type"""
-    is_float = lambda s : True if re.search(r'^[\d,]+\.\d+$', s) else False
-    is_int = lambda s : True if re.search(r'^\d+$', s) else False
-    if is_float(s):
-        s = re.sub(',', '', s)
-        return float(s)
-    elif is_int(s):
+    if float_re.match(s):
+        return float(s.replace(',', ''))
+    elif int_re.match(s):
         return int(s)
     else:
         return s
- 
+
+def to_float(s):
+    return float(s.replace(',', ''))
+
+def to_int(s):
+    return int(s.replace(',', ''))
+
+@lru_cache(maxsize=None)
+def record_type(fields):
+    """Return Record namedtuple class for fields, a tuple of names.
+    Classes are created once per distinct tuple"""
+    return collections.namedtuple('Record', fields)
+
+
+class Schema:
+    """
+    Compiled description of the columns of a schedule.
+    spec is either a string such as 'story:str category:str area:float' or a
+    sequence of such items. Items without a type are cast through caster.
+    """
+    types = dict(str=str, int=to_int, float=to_float, auto=caster)
+
+    def __init__(self, spec):
+        if isinstance(spec, str):
+            spec = spec.split()
+        names, casts = [], []
+        for item in spec:
+            name, _, type_name = item.partition(':')
+            names.append(name)
+            casts.append(self.types[type_name or 'auto'])
+        self.spec = ' '.join(spec)
+        self.fields = tuple(names)
+        self.casts = tuple(casts)
+        self.record = record_type(self.fields)
+        self._identity = all(cast is str for cast in casts)
+
+    def __repr__(self):
+        return '{}: {}'.format(self.__class__, self.spec)
+
+    _compiled = {}
+
+    @classmethod
+    def compile(cls, spec):
+        """Return Schema for spec, compiled once per distinct spec"""
+        key = spec if isinstance(spec, str) else ' '.join(spec)
+        try:
+            return cls._compiled[key]
+        except KeyError:
+            schema = cls._compiled[key] = cls(key)
+            return schema
+
+    def make(self, cells):
+        """Cast cells, a list of strings, and return the matching Record"""
+        if self._identity:
+            return self.record._make(cells)
+        return self.record._make([cast(cell) for cast, cell in zip(self.casts, cells)])
+
+
 class Parser:
     """
     Parser for Archicad schedule export. The result is a sequence of Record objects.
     Each Record is a line in the table, the attributes of record match the headers
     of the table.
     txt - Raw string corresponding to exported schedule
-    fields - Sequence of strings, in order, naming the headers in the schedule
+    fields - Schema spec, in order, naming (and optionally typing) the headers in the schedule
     title - boolean indicating the presence of title line
     header - boolean indicating the presence of header line
+    Parsed rows of string schedules are kept in cache, a TableCache, when given.
     """
     def __init__(self, txt, fields, title, header):
         self.txt = txt
@@ -39,12 +99,32 @@ class Parser:
         self.records = []
 
     @classmethod
-    def parse(cls, txt, fields, title=False, header=True):
-        p = cls(txt, fields, title, header)
-        p.parse_txt()
-        p.tablefy()
-        logger.debug('Parsed table. Result: {}'.format(p.table))
-        return p.table
+    def parse(cls, txt, fields, title=False, header=True, cache=None):
+        table = list(cls.iterparse(txt, fields, title, header, cache))
+        logger.debug('Parsed table with {} records'.format(len(table)))
+        return table
+
+    @staticmethod
+    def iterparse(lines, fields, title=False, header=True, cache=None):
+        """Return iterator yielding one Record per line of lines, either a string or
+        an iterable of lines. Title and header lines are skipped, blank lines
+        are ignored and each cell is cast according to the fields schema.
+        Rows of a string are looked up in and stored to cache, a TableCache, if given"""
+        schema = Schema.compile(fields)
+        if isinstance(lines, str):
+            if cache is not None:
+                parse = lambda : [tuple(record) for record in Parser._records(io.StringIO(lines), schema, title, header)]
+                return map(schema.record._make, cache.rows(lines, schema.spec, title, header, parse))
+            lines = io.StringIO(lines)
+        return Parser._records(lines, schema, title, header)
+
+    @staticmethod
+    def _records(lines, schema, title, header):
+        make = schema.make
+        for line in itertools.islice(lines, int(title) + int(header), None):
+            line = line.rstrip('\n').strip('\t')
+            if line:
+                yield make(line.split('\t'))
 
     def parse_txt(self):
         """From txt (assumed to be Archicad's tab separated schedule)
@@ -58,39 +138,39 @@ class Parser:
         self.matrix = [line.split('\t') for line in lines]
 
     def tablefy(self):
-        """Generator that iterates over rows in texble and converts each element
-        to either a float or keeps it as a string. Choice is made through a regex. 
-        Yields a namedtuple whose attributes are the same as the passed as parameter"""
-        Record = collections.namedtuple('Record', self.fields)
-        matrix = [list(map(caster, line)) for line in self.matrix]
-        self.table = [Record(*line) for line in matrix]
+        """Converts each row in matrix to a Record whose attributes are the fields
+        passed as parameter, casting each element according to the schema"""
+        schema = Schema.compile(self.fields)
+        self.table = [schema.make(line) for line in self.matrix]
             
        
+building_schema = 'story:str category:str area:float'
+subplots_schema = 'id:int name:str area:float'
+perm_schema = 'id:int area:float'
+site_schema = 'id:int area:float'
+
 class BuildingFactory:
     """
     From the text representation of the 'area-by-story' schedule in an Archicad
     file, return an instance of Building.
+    Rows are loaded into Columns and summed per story in a single group by.
     """
     @staticmethod
-    def get_building(model, txt):
+    def get_building(model, txt, cache=None):
         logger.info('Getting building of model {}'.format(model))
-        txt = txt
-        fields = 'story category area'.split()
-        table = Parser.parse(txt, fields)
-        stories = {record.story : Story(i, record.story) for i, record in enumerate(table)}
-        for r in table:
-            stories[r.story].add_area(r.area, r.category)
-        building = Building(model, list(stories.values()))
-        return building
+        columns = Columns.from_records(Parser.iterparse(txt, building_schema, cache=cache))
+        area_comp, area_ncomp = columns.totals()
+        stories = [Story(i, *story) for i, story in enumerate(zip(columns.stories, area_comp, area_ncomp))]
+        return Building(model, stories)
 
 
     @staticmethod
-    def get_buildings(texts, models):
+    def get_buildings(texts, models, cache=None):
         """Return list of buidings, as described by def, writes buildings .tex"""
         buildings = []
         for model in models:
             m = f'{model}.txt'
-            buildings.append(BuildingFactory.get_building(model, texts[m]))
+            buildings.append(BuildingFactory.get_building(model, texts[m], cache))
         buildings.append(BuildingFactory.get_null_building())
         return buildings
 
@@ -105,41 +185,35 @@ class SubplotFactory:
     """
 
     @staticmethod
-    def get_subplots(txt_subplots, txt_perm, relations):
+    def get_subplots(txt_subplots, txt_perm, relations, story_index=None, cache=None):
         """Receive raw text for subplot schedules, raw text for permeable
         areas, list of buildings, dictionary with relationships
-        between subplot id and buildings"""
+        between subplot id and buildings, the project's StoryIndex and TableCache"""
         logger.info('Call to get subplots')
-        table = SubplotFactory._parse_subplots_table(txt_subplots)
-        subplots = {record.id : Land(*record) for record in table}
+        table = SubplotFactory._parse_subplots_table(txt_subplots, cache)
+        subplots = {record.id : Land(*record, story_index=story_index) for record in table}
         logger.debug('Subplots from table: {}'.format(subplots))
         for id, buildings in relations.items():
             subplots[id].buildings = buildings
-        SubplotFactory.parse_perm(txt_perm, subplots)
-        for subplot in subplots.values():
-            subplot.update()
+        SubplotFactory.parse_perm(txt_perm, subplots, cache)
         result = sorted(subplots.values(), key=lambda subplot: subplot.id)
         logger.info('Result from subplots: {}'.format(result))
         return result
     
     @staticmethod
-    def parse_perm(txt, subplots):
+    def parse_perm(txt, subplots, cache=None):
         logger.info('Parsing permeable areas table')
-        fields = 'id area'.split()
-        areas = Parser.parse(txt, fields, header=True)
-        for record in areas:
+        for record in Parser.iterparse(txt, perm_schema, header=True, cache=cache):
             logger.debug('Assigning permeable area {} to subplot {}'.format(record.id, record.area))
             subplots[record.id].area_perm = record.area
 
     @staticmethod
-    def _parse_subplots_table(txt):
+    def _parse_subplots_table(txt, cache=None):
         """Parse subpot defines table.Turn txt into table, rename duplicate records
         by appending number to its name"""
         logger.info('Parsing subplots table.')
-        fields = 'id name area'.split()
-        table = Parser.parse(txt, fields, header=True)
         name_dict = collections.defaultdict(list)
-        for record in table:
+        for record in Parser.iterparse(txt, subplots_schema, header=True, cache=cache):
             name_dict[record.name].append(record)
 
         repeated_names = [seq for seq in name_dict.values() if len(seq) > 1]
@@ -156,9 +230,8 @@ class SubplotFactory:
 
     
 
-def SiteFactory(text, defs):
-    fields = 'id area'.split()
-    records = Parser.parse(text, fields)
+def SiteFactory(text, defs, cache=None):
+    records = Parser.parse(text, site_schema, cache=cache)
     remanescente = Land(0, 'Remanescente', records[0].area)
     atingido = Land(1, 'Atingido', records[1].area)
     site = Site.from_lands(0, 'topografico', [remanescente, atingido], **defs.topografico._asdict())
@@ -0,0 +1,98 @@
+"""
+Module disposes of the dependency graph between a project's input files and
+the tables it publishes, used to rebuild only the tables whose inputs changed.
+"""
+from cache import digest, templates_version
+import json, logging, os, tempfile
+
+logger = logging.getLogger(__name__)
+
+config_name = 'config.ini'
+
+def dependencies(info):
+    """Return dict mapping the name of each output table to the set of input
+    files it is computed from. info is the project's ProjectInfo"""
+    models = {f'{model}.txt' for model in info.misc.files}
+    relations = {info.relations_file} if info.relations_file else set()
+    lot = {'subplots.txt', 'area_perm.txt', config_name} | models | relations
+    graph = {'topografico' : {'topografico.txt', config_name}}
+    for model in info.misc.files:
+        graph[model] = {f'{model}.txt'}
+    graph['null'] = set()
+    graph['subplot-areas'] = {'subplots.txt', config_name} | models | relations
+    graph['suplot-stats'] = lot
+    graph['lot-stats'] = lot | {'topografico.txt'}
+    graph['tos'] = {'subplots.txt', config_name}
+    return graph
+
+
+class BuildState:
+    """
+    Record of the input digests every output was last successfully built from.
+    Stored as JSON in the project's output directory.
+    """
+    file_name = '.unscheduler-state.json'
+
+    def __init__(self, out_path):
+        self.path = out_path / self.file_name
+        try:
+            state = json.loads(self.path.read_text())
+        except (FileNotFoundError, ValueError):
+            state = {}
+        self.outputs = state.get('outputs', {})
+
+    def __repr__(self):
+        s = '{}: path={}; outputs={};'
+        return s.format(self.__class__, self.path, len(self.outputs))
+
+    def record(self, output, digests):
+        """Record output as built from inputs with digests and the current templates"""
+        self.outputs[output] = dict(digests, templates=templates_version())
+
+    def save(self):
+        """Write state atomically"""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(prefix='.state-', dir=self.path.parent)
+        with os.fdopen(fd, 'w') as f:
+            json.dump(dict(outputs=self.outputs), f, indent=1, sort_keys=True)
+        os.replace(tmp, self.path)
+
+
+def input_digests(project, names):
+    """Return dict mapping each input name to the digest of its contents,
+    None for missing files"""
+    digests = {}
+    for name in names:
+        path = project.config if name == config_name else project.schedules / name
+        try:
+            digests[name] = digest(path.read_bytes())
+        except FileNotFoundError:
+            digests[name] = None
+    return digests
+
+def plan(project, state):
+    """Return dict mapping each output that must be rebuilt to the list of reasons why"""
+    graph = dependencies(project.info)
+    digests = input_digests(project, set().union(*graph.values()))
+    templates = templates_version()
+    rebuild = {}
+    for output, inputs in graph.items():
+        reasons = []
+        recorded = state.outputs.get(output)
+        if recorded is None:
+            reasons.append('never built')
+        else:
+            reasons.extend(f'{name} changed' for name in sorted(inputs) if recorded.get(name) != digests[name])
+            if recorded.get('templates') != templates:
+                reasons.append('templates changed')
+        if not (project.out / f'{output}.pdf').exists():
+            reasons.append(f'{output}.pdf missing')
+        if reasons:
+            rebuild[output] = reasons
+    return rebuild
+
+def format_plan(rebuild):
+    """Return the plan as text, one output per line"""
+    if not rebuild:
+        return 'Nothing to rebuild\n'
+    return ''.join('{}: {}\n'.format(output, ', '.join(reasons)) for output, reasons in rebuild.items())
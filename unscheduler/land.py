@@ -3,11 +3,68 @@ import logging
 
 logger = logging.getLogger(__name__)
 
+class Input:
+    """
+    Descriptor for an attribute of Land which aggregates are derived from.
+    Assigning to it discards the cached aggregates of the instance.
+    """
+    def __set_name__(self, owner, name):
+        self.name = name
+        self.slot = '_' + name
+
+    def __get__(self, obj, cls):
+        if obj is None:
+            return self
+        return getattr(obj, self.slot)
+
+    def __set__(self, obj, value):
+        setattr(obj, self.slot, value)
+        obj._aggregates.clear()
+
+
+class Aggregate:
+    """
+    Descriptor for a read only value derived from the inputs of Land.
+    The value is computed on first access and cached until an input changes.
+    """
+    def __init__(self, compute):
+        self.compute = compute
+        self.__doc__ = compute.__doc__
+
+    def __set_name__(self, owner, name):
+        self.name = name
+
+    def __get__(self, obj, cls):
+        if obj is None:
+            return self
+        try:
+            return obj._aggregates[self.name]
+        except KeyError:
+            value = obj._aggregates[self.name] = self.compute(obj)
+            return value
+
+    def __set__(self, obj, value):
+        raise AttributeError(f'{self.name} is computed from the land and can\'t be assigned')
+
+
 class Land:
     """
-    Abstract a section of land
+    Abstract a section of land.
+    super_building and the rates are computed on demand from area, area_perm,
+    buildings and story_index and recomputed only after one of those is reassigned.
+    story_index is the project's StoryIndex, which joins the stories of buildings.
+    Assign a new list to buildings instead of mutating it in place.
+    Land uses __slots__, an instance takes at most 112 bytes on top of its
+    values. Subclasses with class level defaults (Site, Lot) keep a __dict__.
     """
+    __slots__ = ('_aggregates', 'id', 'name', '_area', 'area_ri', 'lands', '_area_perm', '_buildings', '_story_index')
+    area = Input()
+    area_perm = Input()
+    buildings = Input()
+    story_index = Input()
+
     def __init__(self, id, name, area, **kwargs):
+        self._aggregates = {}
         self.id = name
         self.name = name
         self.area = area
@@ -16,29 +73,41 @@ class Land:
         #mutables
         self.area_perm = 0.0
         self.buildings = []
-        self.super_building = None
-        self.coef_aprov = 0.0
-        self.taxa_perm = 0.0
-        self.taxa_ocp = 0.0
+        self.story_index = None
         for key, value in kwargs.items():
             try:
-                getattr(self, key)
+                if not hasattr(type(self), key):
+                    raise AttributeError(key)
                 setattr(self, key, value)
             except AttributeError as e:
                 msg = f'Error assigning {key} to {self}. Invalid attribute.'
                 raise AttributeError(msg) from e
-        self.update()
             
     def __repr__(self):
         s = '{}: id={}, name={}, area={}'
         return s.format(self.__class__, self.id, self.name, self.area)
     
     def update(self):
-        """Rebuild super_building, update coefficients and rates"""
-        self.super_building = Building.get_super_building(self.name, self.buildings)
-        self.coef_aprov = self.super_building.area_comp / self.area
-        self.taxa_perm = (self.area_perm / self.area) * 100
-        self.taxa_ocp = (self.super_building.area_proj / self.area) * 100
+        """Discard super_building, coefficients and rates. They are
+        recomputed on next access"""
+        self._aggregates.clear()
+
+    @Aggregate
+    def super_building(self):
+        """Super building of buildings, shared with every land holding the same buildings"""
+        return Building.get_shared_super_building(self.buildings, self.story_index)
+
+    @Aggregate
+    def coef_aprov(self):
+        return self.super_building.area_comp / self.area
+
+    @Aggregate
+    def taxa_perm(self):
+        return (self.area_perm / self.area) * 100
+
+    @Aggregate
+    def taxa_ocp(self):
+        return (self.super_building.area_proj / self.area) * 100
 
     @classmethod
     def from_lands(cls, id, name, lands, **kwargs):
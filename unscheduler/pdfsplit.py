@@ -0,0 +1,212 @@
+"""
+Module disposes of a minimal pure python PDF page extractor.
+It reads PDFs whose objects are all stored at the top level, with a classic
+cross reference table and no object streams, which is what pdflatex writes
+when \\pdfobjcompresslevel=0. Stream data is copied verbatim.
+"""
+import re
+
+obj_re = re.compile(rb'(\d+)\s+(\d+)\s+obj\b')
+ref_re = re.compile(rb'(\d+)\s+(\d+)\s+R\b')
+stream_re = re.compile(rb'\bstream\r?\n')
+length_re = re.compile(rb'/Length\s+(\d+)(?:\s+(\d+)\s+R\b)?')
+root_re = re.compile(rb'/Root\s+(\d+)\s+\d+\s+R\b')
+pages_re = re.compile(rb'/Pages\s+(\d+)\s+\d+\s+R\b')
+kids_re = re.compile(rb'/Kids\s*\[([^\]]*)\]')
+parent_re = re.compile(rb'/Parent\s+\d+\s+\d+\s+R\b')
+type_page_re = re.compile(rb'/Type\s*/Page(?![A-Za-z])')
+type_pages_re = re.compile(rb'/Type\s*/Pages(?![A-Za-z])')
+inheritable = (b'/Resources', b'/MediaBox', b'/CropBox', b'/Rotate')
+
+class PdfObject:
+    """
+    A top level PDF object. head is the object's text without the stream,
+    stream is the raw stream data or None.
+    """
+    __slots__ = ('number', 'head', 'stream')
+
+    def __init__(self, number, head, stream=None):
+        self.number = number
+        self.head = head
+        self.stream = stream
+
+    def __repr__(self):
+        s = '{}: number={}; stream={};'
+        return s.format(self.__class__, self.number, None if self.stream is None else len(self.stream))
+
+    def refs(self):
+        """Numbers of the objects referenced by this object"""
+        return [int(m.group(1)) for m in ref_re.finditer(self.head)]
+
+
+def dict_value(head, key):
+    """Return raw value of key in the dictionary head or None if absent.
+    Handles nested dictionaries and arrays, references and simple tokens"""
+    m = re.search(re.escape(key) + rb'(?![A-Za-z])\s*', head)
+    if not m:
+        return None
+    start = m.end()
+    if head.startswith(b'<<', start) or head.startswith(b'[', start):
+        opening, closing = (b'<<', b'>>') if head.startswith(b'<<', start) else (b'[', b']')
+        depth, i = 0, start
+        while i < len(head):
+            if head.startswith(opening, i):
+                depth += 1
+                i += len(opening)
+            elif head.startswith(closing, i):
+                depth -= 1
+                i += len(closing)
+                if not depth:
+                    return head[start:i]
+            else:
+                i += 1
+        raise ValueError('Unbalanced value for {}'.format(key))
+    ref = ref_re.match(head, start)
+    if ref:
+        return ref.group()
+    token = re.match(rb'/?[^\s/<>\[\]()]+', head[start:])
+    return token.group() if token else None
+
+
+class PdfReader:
+    """
+    Reads the objects and the ordered list of pages of a PDF held in data (bytes).
+    Raise ValueError for PDFs it can't handle, e.g. ones using object streams.
+    """
+    def __init__(self, data):
+        self.data = data
+        self.version = data[:data.index(b'\n')].strip() if data.startswith(b'%PDF-') else b'%PDF-1.5'
+        self.objects = {}
+        self._scan()
+        root = root_re.findall(data)
+        if not root:
+            raise ValueError('PDF without trailer, object streams are not supported')
+        catalog = self.objects[int(root[-1])]
+        self.pages = []
+        self._collect_pages(int(pages_re.search(catalog.head).group(1)), [])
+
+    def __repr__(self):
+        s = '{}: objects={}; pages={};'
+        return s.format(self.__class__, len(self.objects), len(self.pages))
+
+    def _scan(self):
+        data = self.data
+        pos = 0
+        while True:
+            m = obj_re.search(data, pos)
+            if not m:
+                break
+            number, start = int(m.group(1)), m.end()
+            end = data.find(b'endobj', start)
+            if end < 0:
+                raise ValueError('Object {} is not terminated'.format(number))
+            head = data[start:end]
+            stream = stream_re.search(head)
+            if stream:
+                stream_start = start + stream.end()
+                length = self._length(head[:stream.start()])
+                self.objects[number] = PdfObject(number, head[:stream.start()].strip(),
+                                                 data[stream_start:stream_start + length])
+                end = data.find(b'endobj', stream_start + length)
+                if end < 0:
+                    raise ValueError('Object {} is not terminated'.format(number))
+            else:
+                self.objects[number] = PdfObject(number, head.strip())
+            pos = end + len(b'endobj')
+
+    def _length(self, head):
+        m = length_re.search(head)
+        if not m:
+            raise ValueError('Stream without /Length')
+        if m.group(2) is None:
+            return int(m.group(1))
+        number = int(m.group(1))
+        if number in self.objects:
+            return int(self.objects[number].head)
+        direct = re.search(rb'(?<!\d)%d\s+0\s+obj\s*(\d+)\s*endobj' % number, self.data)
+        if not direct:
+            raise ValueError('Unresolved stream length object {}'.format(number))
+        return int(direct.group(1))
+
+    def _collect_pages(self, number, ancestors):
+        node = self.objects[number]
+        if type_pages_re.search(node.head):
+            for kid in ref_re.finditer(kids_re.search(node.head).group(1)):
+                self._collect_pages(int(kid.group(1)), ancestors + [node])
+        elif type_page_re.search(node.head):
+            self.pages.append((node, ancestors))
+        else:
+            raise ValueError('Object {} in page tree is not a page'.format(number))
+
+    def closure(self, indices):
+        """Return (heads, order) for the pages at indices. heads maps each page's
+        number to its head with inherited attributes copied and /Parent dropped,
+        order lists the numbers of the pages and of every object they refer to"""
+        pages = [self.pages[i] for i in indices]
+        page_numbers = {page.number for page, _ in self.pages}
+        tree = {ancestor.number for _, ancestors in self.pages for ancestor in ancestors}
+        heads = {}
+        for page, ancestors in pages:
+            head = parent_re.sub(b'', page.head)
+            for key in inheritable:
+                if dict_value(head, key) is None:
+                    for ancestor in reversed(ancestors):
+                        value = dict_value(ancestor.head, key)
+                        if value is not None:
+                            head = head.rstrip()[:-2] + key + b' ' + value + b' >>'
+                            break
+            heads[page.number] = head
+        order = [page.number for page, _ in pages]
+        seen = set(order)
+        i = 0
+        while i < len(order):
+            number = order[i]
+            head = heads.get(number, self.objects[number].head)
+            for ref in ref_re.finditer(head):
+                ref = int(ref.group(1))
+                if ref not in seen and ref in self.objects and ref not in page_numbers and ref not in tree:
+                    seen.add(ref)
+                    order.append(ref)
+            i += 1
+        return heads, order
+
+    def extract(self, indices):
+        """Return bytes of a new PDF made of the pages at indices (0 based)"""
+        return merge([(self, indices)])
+
+
+def merge(parts):
+    """Return bytes of a new PDF made of the pages of parts, a list of
+    (PdfReader, indices) pairs, in order"""
+    version = max(reader.version for reader, _ in parts)
+    objects, kids = [], []
+    for reader, indices in parts:
+        heads, order = reader.closure(indices)
+        mapping = {number : len(objects) + i + 3 for i, number in enumerate(order)}
+        renumber = lambda m, mapping=mapping : b'%d 0 R' % mapping[int(m.group(1))] if int(m.group(1)) in mapping else b'null'
+        kids.extend(mapping[reader.pages[i][0].number] for i in indices)
+        for number in order:
+            obj = reader.objects[number]
+            head = ref_re.sub(renumber, heads.get(number, obj.head))
+            if number in heads:
+                head = head.rstrip()[:-2] + b' /Parent 2 0 R >>'
+            objects.append((head, obj.stream))
+
+    out = bytearray(version + b'\n%\xe2\xe3\xcf\xd3\n')
+    offsets = []
+    def write(number, head, stream=None):
+        offsets.append(len(out))
+        out.extend(b'%d 0 obj\n' % number + head + b'\n')
+        if stream is not None:
+            out.extend(b'stream\n' + stream + b'\nendstream\n')
+        out.extend(b'endobj\n')
+    write(1, b'<< /Type /Catalog /Pages 2 0 R >>')
+    write(2, b'<< /Type /Pages /Kids [' + b' '.join(b'%d 0 R' % kid for kid in kids) + b'] /Count %d >>' % len(kids))
+    for number, (head, stream) in enumerate(objects, 3):
+        write(number, head, stream)
+    xref = len(out)
+    out.extend(b'xref\n0 %d\n0000000000 65535 f \n' % (len(offsets) + 1))
+    for offset in offsets:
+        out.extend(b'%010d 00000 n \n' % offset)
+    out.extend(b'trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n' % (len(offsets) + 1, xref))
+    return bytes(out)
@@ -0,0 +1,112 @@
+"""
+Module disposes of the asynchronous pipeline, which starts compiling each table
+as soon as the parts of the model it shows are computed, instead of after the
+whole project is loaded and every table written.
+The model is computed on a worker thread which writes each table as it becomes
+ready, off the event loop, and hands it to the loop. The loop runs pdflatex in
+asyncio subprocesses, at most jobs at a time.
+"""
+from functools import partial
+from subprocess import PIPE, STDOUT, DEVNULL
+from aux import Charlie, Stage
+import asyncio, logging, shutil, time, tracing
+
+logger = logging.getLogger(__name__)
+
+class AsyncCharlie(Charlie):
+    """
+    Charlie compiling .tex files one by one as they're handed to it.
+    Tables are compiled as soon as they're ready, so they're never combined.
+    """
+    def __init__(self, work_dir, out_path, jobs=None, cache=None):
+        super().__init__(work_dir, out_path, jobs, cache)
+        self.semaphore = asyncio.Semaphore(self.jobs)
+
+    async def compile_named(self, path):
+        """Compile path. Return (file name, exit status)"""
+        return path.name, await self.compile_async(path)
+
+    async def compile_async(self, path):
+        """Compile the .tex file at path unless it's cached, in a private directory
+        like Charlie.compile. Return pdflatex's exit status"""
+        loop = asyncio.get_running_loop()
+        if await loop.run_in_executor(None, self.fetch, path):
+            return 0
+        async with self.semaphore:
+            job_dir = self.job_dir(path)
+            try:
+                attempts = self.attempts(path, job_dir)
+                while True:
+                    attempt = await loop.run_in_executor(None, next, attempts, None)
+                    if attempt is None:
+                        break
+                    returncode = await self.run_command_async(path, *attempt, job_dir)
+                    if returncode == 0:
+                        break
+                await loop.run_in_executor(None, self.collect, path, job_dir, returncode)
+                return returncode
+            finally:
+                shutil.rmtree(job_dir, ignore_errors=True)
+
+    async def run_command_async(self, path, options, source, job_dir):
+        logger.debug('Converting {}'.format(path.name))
+        ts, start = time.time_ns() // 1000, time.perf_counter()
+        process = await asyncio.create_subprocess_exec(*self.command(options, source, job_dir),
+                                                       stdin=DEVNULL, stdout=PIPE, stderr=STDOUT)
+        try:
+            output, _ = await process.communicate()
+        except asyncio.CancelledError:
+            process.kill()
+            await process.wait()
+            raise
+        fmt = any(option.startswith('-fmt=') for option in options)
+        tracing.record('pdflatex', ts, time.perf_counter() - start,
+                       dict(file=path.name, format=fmt, status=process.returncode))
+        self.report(path, process.returncode, output)
+        return process.returncode
+
+
+async def publish(project, jobs=None, cache=None, rebuild_all=False, changed=None):
+    """Load project, or update it after changed schedules, and publish its tables,
+    all of them if rebuild_all is set or else those whose inputs changed. Each table
+    is compiled as soon as it's ready. If loading fails, the compilations under way
+    are cancelled and their pdflatex processes killed before the stage is removed.
+    Return dict with the exit status of each compiled file"""
+    loop = asyncio.get_running_loop()
+    if changed is None or project.config.name in changed:
+        project.info = None
+        load = project.load
+    else:
+        load = partial(project.update, changed)
+    outputs = None if rebuild_all else project.plan()
+    with Stage(project.out) as stage:
+        charlie = AsyncCharlie(stage.path, stage.path, jobs, cache)
+        tasks = []
+
+        def submit(path):
+            tasks.append(loop.create_task(charlie.compile_named(path)))
+
+        def ready(name):
+            if outputs is None or name in outputs:
+                for path in project.write(name, stage.path):
+                    loop.call_soon_threadsafe(submit, path)
+
+        try:
+            with tracing.stage('load'):
+                await asyncio.to_thread(load, ready=ready)
+            results = await asyncio.gather(*tasks)
+        finally:
+            pending = [task for task in tasks if not task.done()]
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+        statuses = charlie.merge_parts(dict(results))
+        for name, status in statuses.items():
+            if status:
+                logger.error('pdflatex failed for {} with exit status {}'.format(name, status))
+        if cache:
+            await loop.run_in_executor(None, cache.prune)
+        with tracing.stage('publish'):
+            stage.publish()
+    project.record(statuses)
+    return statuses
@@ -0,0 +1,164 @@
+"""
+Module disposes of Project, which ties a project's folder structure to the
+pipeline that turns its schedules into published tables.
+"""
+from tables import lot_tables, write_table
+from aux import ProjectInfo, read_texts, Charlie, Stage
+from factory import BuildingFactory, SubplotFactory, SiteFactory
+from cache import BuildCache
+from graph import BuildState, config_name, dependencies, plan
+from pathlib import Path
+from building import StoryIndex
+from land import Lot
+import asyncio, logging, pipeline, tracing
+
+logger = logging.getLogger(__name__)
+
+class Project:
+    """
+    A project rooted at root. Expected folder structure:
+    root/config.ini
+    root/publisher/schedules/*.txt - schedules exported from Archicad
+    root/publisher/unscheduler/*.pdf - published tables
+    Schedules are parsed through table_cache, a TableCache, if given.
+    """
+    def __init__(self, root, table_cache=None):
+        self.root = Path(root).absolute()
+        self.table_cache = table_cache
+        self.config = self.root / 'config.ini'
+        self.schedules = self.root / 'publisher' / 'schedules'
+        self.out = self.root / 'publisher' / 'unscheduler'
+        self.info = None
+        self.texts = None
+        self.site = None
+        self.buildings = []
+        self.story_index = None
+        self.lot = None
+
+    def __repr__(self):
+        s = '{}: root={};'
+        return s.format(self.__class__, self.root)
+
+    def load(self, ready=None):
+        """Read config and schedules and compute site, buildings, subplots and lot"""
+        logger.info('Loading {}'.format(self.root))
+        with tracing.stage('config'):
+            self.info = ProjectInfo(self.config)
+        self.texts = read_texts(self.schedules, self.info.schedule_files())
+        self._buildings = {}
+        return self.update(ready=ready)
+
+    def update(self, changed=None, ready=None):
+        """Recompute the parts of the model that depend on changed, a set of schedule
+        file names. Schedules which did not change are neither read nor parsed again.
+        None recomputes everything. ready, if given, is called with the name of each
+        table as soon as the parts of the model it shows are up to date"""
+        ready = ready or (lambda name : None)
+        if changed is not None:
+            self.texts.invalidate(changed)
+        stale = lambda name : changed is None or name in changed
+        site = self.site is None or stale('topografico.txt')
+        models = self.info.misc.files
+        rebuilt = [model for model in models if model not in self._buildings or stale(f'{model}.txt')]
+        lot_files = ['subplots.txt', 'area_perm.txt'] + [self.info.relations_file] * bool(self.info.relations_file)
+        lot = self.lot is None or rebuilt or any(map(stale, lot_files))
+        names = ['topografico.txt'] * site + [f'{model}.txt' for model in rebuilt] + lot_files * bool(lot)
+        with tracing.stage('read_texts', files=len(names)):
+            texts = {name : self.texts[name] for name in names}
+        if site:
+            with tracing.stage('site'):
+                self.site = SiteFactory(texts['topografico.txt'], self.info, self.table_cache)
+        ready('topografico')
+        with tracing.stage('buildings', models=len(rebuilt)):
+            for model in rebuilt:
+                self._buildings[model] = BuildingFactory.get_building(model, texts[f'{model}.txt'], self.table_cache)
+                ready(model)
+        for model in set(models).difference(rebuilt):
+            ready(model)
+        if lot:
+            if 'null' not in self._buildings:
+                self._buildings['null'] = BuildingFactory.get_null_building()
+            self.buildings = [self._buildings[model] for model in models] + [self._buildings['null']]
+            self.story_index = StoryIndex(self.buildings, self.info.levels)
+            with tracing.stage('subplots'):
+                self.info.build_relations(self.buildings, texts.get(self.info.relations_file))
+                subplots = SubplotFactory.get_subplots(texts['subplots.txt'], texts['area_perm.txt'],
+                                                       self.info.relations, self.story_index, self.table_cache)
+            with tracing.stage('lot', subplots=len(subplots)):
+                self.lot = Lot.from_lands(0, 'lote', subplots, story_index=self.story_index,
+                                          **self.info.misc._asdict())
+        for name in ['null', *lot_tables]:
+            ready(name)
+        return self
+
+    def write(self, name, out):
+        """Write the .tex file(s) of table name to out. Return list of written Paths"""
+        return write_table(name, self.site, self.lot, self._buildings, out)
+
+    def plan(self):
+        """Return dict mapping each table that must be rebuilt to the reasons why"""
+        if self.info is None:
+            self.info = ProjectInfo(self.config)
+        with tracing.stage('plan'):
+            return plan(self, BuildState(self.out))
+
+    def publish(self, jobs=None, cache=None, outputs=None, combined=False):
+        """Write and compile the tables in outputs (all of them if None) in a private
+        stage and publish the pdfs. Tables built successfully are recorded in the
+        project's BuildState. Return dict with the exit status of each compiled file"""
+        with Stage(self.out) as stage:
+            with tracing.stage('write_tables'):
+                write_tables(self.site, self.lot, self.buildings, stage.path, outputs)
+            with tracing.stage('compile') as args:
+                statuses = Charlie.do(stage.path, stage.path, jobs, cache, combined)
+                args['files'] = len(statuses)
+            with tracing.stage('publish'):
+                stage.publish()
+        self.record(statuses)
+        return statuses
+
+    def record(self, statuses):
+        """Record the tables in statuses which compiled successfully in the project's BuildState,
+        with the digests of the inputs as they were loaded, not as they are now on disk"""
+        with tracing.stage('build_state'):
+            graph = dependencies(self.info)
+            digests = {config_name : self.info.digest, **self.texts.digests}
+            state = BuildState(self.out)
+            for name, status in statuses.items():
+                output = name[:-len('.tex')]
+                if not status and output in graph:
+                    state.record(output, {input : digests.get(input) for input in graph[output]})
+            state.save()
+
+
+def get_cache(args):
+    """Return the BuildCache requested by the command line arguments, if any"""
+    if args.no_cache:
+        return None
+    return BuildCache(args.cache_dir, args.cache_size * 2**20)
+
+def table_cache(cache):
+    """Return the TableCache of cache, a BuildCache or None"""
+    return cache.tables if cache else None
+
+def publish(root, args):
+    """Load and publish project at root according to the command line arguments.
+    Only tables whose inputs changed are rebuilt unless args.all is set.
+    Return list of the tables which failed to compile"""
+    cache = get_cache(args)
+    if args.use_async:
+        statuses = asyncio.run(pipeline.publish(Project(root, table_cache(cache)), args.jobs, cache, args.all))
+        return [name for name, status in statuses.items() if status]
+    with tracing.stage('load', project=str(root)):
+        project = Project(root, table_cache(cache)).load()
+    outputs = None if args.all else project.plan()
+    statuses = project.publish(args.jobs, cache, outputs, args.combined)
+    return [name for name, status in statuses.items() if status]
+
+def write_tables(site, lot, buildings, out, outputs=None):
+    """Write the .tex file of every table in outputs, a collection of table names,
+    to out. None writes all tables"""
+    models = {building.model : building for building in buildings}
+    for name in ['topografico', *models, *lot_tables]:
+        if outputs is None or name in outputs:
+            write_table(name, site, lot, models, out)
@@ -0,0 +1,67 @@
+"""
+Module disposes of the stats backend, which writes the numbers computed for a
+project's lot and subplots as JSON or CSV. It reads the model directly and
+never writes LaTeX nor runs pdflatex.
+"""
+from pathlib import Path
+from project import Project, get_cache, table_cache
+import csv, json, logging, math, sys
+
+logger = logging.getLogger(__name__)
+
+subplot_fields = ['name', 'area_proj', 'area', 'taxa_ocp', 'coef_aprov', 'area_perm', 'taxa_perm']
+
+def number(x):
+    """Return x, or None if x is a float JSON can't represent"""
+    return None if isinstance(x, float) and not math.isfinite(x) else x
+
+def lot_stats(site, lot):
+    """Return dict with the figures of the lot statistics table"""
+    building = lot.super_building
+    stats = dict(area_ri=site.area_ri, area_real=site.area, area_atingida=site.atingido.area,
+                 area_remanescente=site.remanescente.area, area_comp=building.area_comp,
+                 area_ncomp=building.area_ncomp, area_proj=building.area_proj, taxa_ocp=lot.taxa_ocp,
+                 coef_aprov=lot.coef_aprov, area_perm=lot.area_perm, taxa_perm=lot.taxa_perm,
+                 units=lot.units, rec_desc=lot.rec_desc, rec_cob=lot.rec_cob, rec=lot.rec)
+    try:
+        stats['cm'] = lot.calc_cm()
+    except ZeroDivisionError:
+        stats['cm'] = None
+    return {key : number(value) for key, value in stats.items()}
+
+def subplot_row(land):
+    """Return dict with the figures of land's row in the subplot statistics table"""
+    return dict(name=land.name, area_proj=land.super_building.area_proj, area=land.area,
+                taxa_ocp=number(land.taxa_ocp), coef_aprov=number(land.coef_aprov),
+                area_perm=land.area_perm, taxa_perm=number(land.taxa_perm))
+
+def write_json(site, lot, f):
+    """Write the stats of site and lot to f as a JSON object, one subplot per line"""
+    f.write('{"lot": ' + json.dumps(lot_stats(site, lot)) + ',\n"subplots": [')
+    separator = '\n'
+    for land in lot.lands:
+        f.write(separator + json.dumps(subplot_row(land)))
+        separator = ',\n'
+    f.write('\n]}\n')
+
+def write_csv(site, lot, f):
+    """Write a row per subplot of lot to f as CSV, followed by a row for the lot itself.
+    As in the subplot statistics table, the lot's rates are '-'"""
+    writer = csv.DictWriter(f, subplot_fields, lineterminator='\n')
+    writer.writeheader()
+    for land in lot.lands:
+        writer.writerow(subplot_row(land))
+    writer.writerow(dict(subplot_row(lot), taxa_ocp='-', coef_aprov='-', taxa_perm='-'))
+
+writers = dict(json=write_json, csv=write_csv)
+
+def write_stats(root, args):
+    """Load project at root and write its stats in args.format to args.output,
+    standard output if not given"""
+    project = Project(root, table_cache(get_cache(args))).load()
+    write = writers[args.format]
+    if args.output is None:
+        write(project.site, project.lot, sys.stdout)
+    else:
+        with Path(args.output).open('w', newline='') as f:
+            write(project.site, project.lot, f)
@@ -2,16 +2,106 @@
 Each type of Table is a subclass of BaseBuilder """
 
 from pathlib import Path
+from functools import lru_cache
+from string import Formatter
+import io, itertools
 
 templates_path = Path(__file__).parent / '..' / 'templates'
 fmt_area = lambda s : '${:.2f}$ m$^2$'.format(s)
-fmt_perc = lambda s : '${:.2f}$\%'.format(s)
+fmt_perc = lambda s : r'${:.2f}$\%'.format(s)
 fmt_float = lambda s : '${:.2f}$'.format(s)
 
+latex_specials = str.maketrans({
+    '\\' : r'\textbackslash{}', '&' : r'\&', '%' : r'\%', '$' : r'\$', '#' : r'\#',
+    '_' : r'\_', '{' : r'\{', '}' : r'\}', '~' : r'\textasciitilde{}', '^' : r'\textasciicircum{}',
+})
+
+def escape(s):
+    """Escape LaTeX special characters in s"""
+    return s.translate(latex_specials)
+
+@lru_cache(maxsize=None)
+def row_format(width):
+    """Return the format string of a tabular row of width cells"""
+    return ' & '.join(['{}'] * width) + r' \\'
+
 def table_writer(source, p):
     with p.open('w') as f:
         f.write(source)
 
+class Template:
+    """
+    LaTeX template in str.format syntax with positional fields only, pre-parsed
+    into the literal text between fields so rendering writes straight into a buffer.
+    """
+    def __init__(self, text):
+        self.text = text
+        self.literals = []
+        literal = []
+        for text, field, spec, conversion in Formatter().parse(text):
+            literal.append(text)
+            if field is not None:
+                if field or spec or conversion:
+                    raise ValueError('Template fields must be plain {{}}, found {{{}}}'.format(field))
+                self.literals.append(''.join(literal))
+                literal = []
+        self.literals.append(''.join(literal))
+        self.fields = len(self.literals) - 1
+
+    def __repr__(self):
+        return '{}: fields={};'.format(self.__class__, self.fields)
+
+    def render(self, out, args):
+        """Write template to out, a file like object, with its fields replaced by args.
+        An arg may be a callable, in which case it's called with out to write the field.
+        As with str.format, extra args are ignored"""
+        if len(args) < self.fields:
+            raise IndexError('Template takes {} arguments, got {}'.format(self.fields, len(args)))
+        write = out.write
+        for literal, arg in zip(self.literals[:-1], args):
+            write(literal)
+            if callable(arg):
+                arg(out)
+            else:
+                write(str(arg))
+        write(self.literals[-1])
+
+    def format(self, *args):
+        out = io.StringIO()
+        self.render(out, list(args))
+        return out.getvalue()
+
+
+class TemplateRegistry:
+    """
+    Loads and parses templates from path the first time each one is requested
+    """
+    def __init__(self, path):
+        self.path = path
+        self._templates = {}
+
+    def get(self, name):
+        try:
+            return self._templates[name]
+        except KeyError:
+            template = self._templates[name] = Template((self.path / name).read_text())
+            return template
+
+registry = TemplateRegistry(templates_path)
+
+
+class TemplateFile:
+    """
+    Class attribute of a formatter naming its template file. Accessing it returns
+    the parsed Template from the registry. Instances may assign their own template.
+    """
+    def __init__(self, name):
+        self.name = name
+
+    def __get__(self, obj, cls):
+        return registry.get(self.name)
+
+
 class LatexFormatter:
     """
     Base class with methods to format a table from a list of lists
@@ -20,45 +110,49 @@ class LatexFormatter:
     template = None
     headers = True
     title = False
-    def _tabularfy(self, matrix):
-        """Generate simple latex formatting for a latex tabular environment. 
-        Returns the contents of the Latex tabular environment as a list of strings.
+    def _write_tabular(self, matrix, out):
+        """Write the lines of the Latex tabular environment of matrix to out,
+        each row through the precompiled format of its width.
         title flag indicates whether or not matrix the first row of the matrix
         contais a "title".
         headers flag indicates whether or not the second row (first if there's
         no title) is a row of headers.
         """
         hline = r'\hline'
-        tabular = []
+        write = out.write
+        rows = iter(matrix)
         if self.title:
-            tabular.append(self._format_row(matrix.pop(0)))
+            self._write_row(next(rows), write)
+            write('\n')
         if self.headers:
-            tabular.append(hline)
-            tabular.append(self._format_row(matrix.pop(0)))
-        tabular.append(hline)
-        tabular.extend([self._format_row(row) for row in matrix])
-        tabular.append(hline)
-        return tabular
+            write(hline + '\n')
+            self._write_row(next(rows), write)
+            write('\n')
+        write(hline)
+        for row in rows:
+            write('\n')
+            self._write_row(row, write)
+        write('\n' + hline)
 
     @staticmethod
-    def _format_row(row):
-        """ Takes a list of strings under the assumption that each
-        element in that list is a cell in a tabular row. 
-        Returns a string with matching latex code for the row """
-        code = ' & '.join(row) + r' \\'
-        return code
+    def _write_row(row, write):
+        """Write row, a list of cells, as a tabular row with write"""
+        write(row_format(len(row)).format(*row))
 
     def _get_latex(self, matrix, args=[]):
         """From matrix (which contains the body of the table as a list of lists,
         return string which is the corresponding matrix in a LaTeX format
         inserted into template. Optionally passes *args to format call on template"""
-        tabular = '\n'.join(self._tabularfy(matrix))
-        return self.template.format(*args + [tabular])
+        template = self.template
+        if isinstance(template, str):
+            template = Template(template)
+        out = io.StringIO()
+        template.render(out, args + [lambda out : self._write_tabular(matrix, out)])
+        return out.getvalue()
 
 
 class SiteFormatter(LatexFormatter):
-    template_path = templates_path / 'story-template.tex'
-    template = template_path.read_text()
+    template = TemplateFile('story-template.tex')
     headers = False
     title = False
     def format(self, site):
@@ -85,8 +179,7 @@ class StoryFormatter(LatexFormatter):
     An initialized instance of StoryFormatter returns text
     matching a latex file for a Story Table
     """
-    template_path = templates_path / 'story-template.tex'
-    template = template_path.read_text()
+    template = TemplateFile('story-template.tex')
     headers = True
     title = True
     def format(self, story):
@@ -96,7 +189,7 @@ class StoryFormatter(LatexFormatter):
         return self._get_latex(table)
 
     def _build_table(self, story):
-        title = ['', story.name.upper(), '']
+        title = ['', escape(story.name.upper()), '']
         headers = ['AREA COMP.', 'AREA NAO COMP.', 'TOTAL']
         body = [[fmt_area(story.area_comp), fmt_area(story.area_ncomp), fmt_area(story.total)]]
         return [title, headers] + body
@@ -107,8 +200,7 @@ class BuildingFormatter(LatexFormatter):
     Transform a Building object into a table in the Latex format. Return a string
     which when written to a file can be processed by pdflatex.
     """
-    template_path = templates_path / 'building-template.tex'
-    template = template_path.read_text()
+    template = TemplateFile('building-template.tex')
     headers = True
     title = False
     def format(self, building):
@@ -119,8 +211,8 @@ class BuildingFormatter(LatexFormatter):
         
     def _build_table(self, building):
         headers = ['PAVIMENTO', 'AREA COMP.', 'AREA NAO COMP.']
-        formatter = lambda s : [s.name.upper(), fmt_area(s.area_comp), fmt_area(s.area_ncomp)]
-        body = [formatter(story) for story in building.stories + [building.super_story]]
+        formatter = lambda s : [escape(s.name.upper()), fmt_area(s.area_comp), fmt_area(s.area_ncomp)]
+        body = [formatter(story) for story in building.all_stories()]
         return [headers] + body
 
 
@@ -128,43 +220,84 @@ class SubAreasFormatter(LatexFormatter):
     """
     Class that operate on an instance of Lot to generate a string representing
     the Subplot Areas table needed for the building plans.
+    Lots with more rows than rows_per_shard are written by write in page sized
+    shards, independent documents which are compiled in parallel and merged
+    into a single pdf. Rows are streamed into the shards as they're produced.
     """
     title = True
     headers = True
-    template_path = templates_path / 'subplot-areas-template.tex'
-    template = template_path.read_text()
+    template = TemplateFile('subplot-areas-template.tex')
+    rows_per_shard = 40
+    shard_name = '{}.part-{:03d}.tex'
+
     def format(self, lot):
         table = self._build_table(lot)
         table_fmt = 'l' * len(table[0])
         args = [table_fmt]
         tex = self._get_latex(table, args)
         return tex
- 
+
+    def write(self, lot, out, name='subplot-areas'):
+        """Write the table of lot to out as name.tex or, if it doesn't fit
+        rows_per_shard rows, as shards name.part-NNN.tex. Return list of written Paths"""
+        if len(lot.lands) + 1 <= self.rows_per_shard:
+            path = out / f'{name}.tex'
+            path.write_text(self.format(lot))
+            return [path]
+        stories = lot.super_building.all_stories()
+        head = [self._title(stories), self._header(stories)]
+        args = ['l' * len(head[0])]
+        names = [story.name for story in lot.super_building.stories]
+        rows = (self._row(s, names) for s in itertools.chain(lot.lands, [lot]))
+        paths = []
+        for i in itertools.count(1):
+            shard = list(itertools.islice(rows, self.rows_per_shard))
+            if not shard:
+                return paths
+            path = out / self.shard_name.format(name, i)
+            with path.open('w') as f:
+                f.write('\\pdfobjcompresslevel=0\n')
+                self.template.render(f, args + [lambda f : self._write_tabular(head + shard, f)])
+            paths.append(path)
+
     @staticmethod
-    def _build_table(lot):
+    def _title(stories):
         title = ['']
-        for story in lot.super_building.all_stories():
-            title.extend([story.name.upper(), ''])
+        for story in stories:
+            title.extend([escape(story.name.upper()), ''])
+        return title
+
+    @staticmethod
+    def _header(stories):
         header = ['SUBLOTE']
-        for _ in lot.super_building.all_stories():
+        for _ in stories:
             header.extend(['COMP', 'N COMP'])
-        body = []
-        for s in lot.lands + [lot]:
-            row = []
-            row.append(s.name.upper())
-            for story in s.super_building.all_stories():
-                row.append(fmt_area(story.area_comp))
-                row.append(fmt_area(story.area_ncomp))
-            body.append(row)
-        return [title, header] + body
+        return header
+
+    @staticmethod
+    def _row(s, names):
+        """Row of land s with its areas on each story in names, the lot's stories,
+        zero on those it lacks, and its total"""
+        building = s.super_building
+        row = [escape(s.name.upper())]
+        for story in [*building.stories_named(names), building.super_story]:
+            row.append(fmt_area(story.area_comp))
+            row.append(fmt_area(story.area_ncomp))
+        return row
+
+    @classmethod
+    def _build_table(cls, lot):
+        stories = lot.super_building.all_stories()
+        names = [story.name for story in lot.super_building.stories]
+        body = [cls._row(s, names) for s in lot.lands + [lot]]
+        return [cls._title(stories), cls._header(stories)] + body
 
 
 class SubStatsFormatter(LatexFormatter):
     """Operate on lot to produce the Suplot stats text
     for the Subplot stats table
     """
-    template_path = templates_path / 'subplot-stats-template.tex'
-    template = template_path.read_text()
+    template = TemplateFile('subplot-stats-template.tex')
     headers = False
     title = False
     def format(self, lot):
@@ -182,7 +315,7 @@ class SubStatsFormatter(LatexFormatter):
 
     @staticmethod
     def _gen_row(s):
-        row = [s.name.upper()]
+        row = [escape(s.name.upper())]
         row.append(fmt_area(s.super_building.area_proj))
         row.append(fmt_area(s.area))
         row.append(fmt_perc(s.taxa_ocp))
@@ -196,8 +329,7 @@ class LotStatsFormatter(LatexFormatter):
     """
     Operate on lot to return the text for the Lot statistics table.
     """
-    template_path = templates_path / 'lot-stats-template.tex'
-    template = template_path.read_text()
+    template = TemplateFile('lot-stats-template.tex')
     headers = True
     title = False
     def format(self, site, lot):
@@ -231,8 +363,7 @@ class LotStatsFormatter(LatexFormatter):
 
 class TOSFormatter(LatexFormatter):
     """TOS calculation latex file"""
-    template_path = templates_path / 'tos-template.tex'
-    template = template_path.read_text()
+    template = TemplateFile('tos-template.tex')
     title = False
     headers = False
     def format(self, lot):
@@ -245,8 +376,7 @@ class TOSFormatter(LatexFormatter):
 class SheetChartFormatter(LatexFormatter):
     """Formatter that generate the tex for the information chart present
     in every building plan sheet."""
-    template_path = templates_path / 'sheet-chart-template.tex'
-    template = template_path.read_text()
+    template = TemplateFile('sheet-chart-template.tex')
     title = False
     headers = False
     def format(self, project_info):
@@ -254,3 +384,28 @@ class SheetChartFormatter(LatexFormatter):
         init_month, init_year = project_info['inicio'].split('/')
         args = [init_month, init_year, project_info['titulo'], project_info['prop']]
         return self._get_latex([], args=args)
+
+
+lot_formatters = {
+    'suplot-stats' : lambda site, lot : SubStatsFormatter().format(lot),
+    'lot-stats' : lambda site, lot : LotStatsFormatter().format(site, lot),
+    'tos' : lambda site, lot : TOSFormatter().format(lot),
+}
+lot_tables = ['subplot-areas', *lot_formatters]
+
+def write_table(name, site, lot, buildings, out):
+    """Write the .tex file(s) of table name to out. buildings maps models to
+    Buildings. Return list of written Paths"""
+    if name == 'subplot-areas':
+        return SubAreasFormatter().write(lot, out, name)
+    if name == 'topografico':
+        source = SiteFormatter().format(site)
+    elif name in buildings:
+        building = buildings[name]
+        source = building.formatter.format(building)
+    else:
+        source = lot_formatters[name](site, lot)
+    path = out / f'{name}.tex'
+    with path.open('w') as f:
+        f.write(source)
+    return [path]
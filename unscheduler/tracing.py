@@ -0,0 +1,164 @@
+"""
+Module disposes of tracing, which records wall time, CPU time and peak memory
+of each stage of the pipeline and of every pdflatex run, and writes them in
+the Chrome trace format (chrome://tracing, Perfetto).
+Tracing is off until a Tracer is installed, stages then cost a function call.
+"""
+from contextlib import contextmanager, nullcontext
+from pathlib import Path
+import cProfile, json, logging, os, resource, threading, time, tracemalloc
+
+logger = logging.getLogger(__name__)
+
+class NullTracer:
+    """
+    Tracer which records nothing, installed by default
+    """
+    events = ()
+
+    def __repr__(self):
+        return '{}:'.format(self.__class__)
+
+    def stage(self, name, **args):
+        return nullcontext({})
+
+    def record(self, name, ts, duration, args):
+        pass
+
+    def close(self):
+        pass
+
+
+class Tracer:
+    """
+    Records a complete event per stage. Stages may nest. Stages on the main
+    thread record process CPU time, CPU time of child processes reaped during
+    the stage and peak traced memory; stages on other threads, such as pdflatex
+    runs, record the thread's CPU time. If profile_dir is given, each outermost
+    stage on the main thread is run under cProfile and its stats dumped there.
+    tracemalloc is started for peak memory unless already tracing, and stopped
+    again when the tracer is closed.
+    """
+    def __init__(self, profile_dir=None, memory=True):
+        self.events = []
+        self.profile_dir = Path(profile_dir) if profile_dir else None
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._profiling = False
+        self._dumps = 0
+        if self.profile_dir:
+            self.profile_dir.mkdir(parents=True, exist_ok=True)
+        self._tracemalloc = memory and not tracemalloc.is_tracing()
+        if self._tracemalloc:
+            tracemalloc.start()
+
+    def __repr__(self):
+        s = '{}: events={}; profile_dir={};'
+        return s.format(self.__class__, len(self.events), self.profile_dir)
+
+    @contextmanager
+    def stage(self, name, **args):
+        """Record the enclosed block as stage name. Yield args, a dict which is
+        stored with the event and which the block may add to"""
+        main = threading.current_thread() is threading.main_thread()
+        peaks = self._local.__dict__.setdefault('peaks', [])
+        memory = main and tracemalloc.is_tracing()
+        if memory:
+            if peaks:
+                peaks[-1] = max(peaks[-1], tracemalloc.get_traced_memory()[1])
+            tracemalloc.reset_peak()
+        peaks.append(0)
+        profile = None
+        if main and self.profile_dir and not self._profiling:
+            self._profiling = True
+            profile = cProfile.Profile()
+        children = children_cpu() if main else 0
+        cpu = time.process_time() if main else time.thread_time()
+        ts = time.time_ns() // 1000
+        start = time.perf_counter()
+        if profile:
+            profile.enable()
+        try:
+            yield args
+        finally:
+            if profile:
+                profile.disable()
+            duration = time.perf_counter() - start
+            args['cpu'] = round((time.process_time() if main else time.thread_time()) - cpu, 6)
+            if main:
+                args['children_cpu'] = round(children_cpu() - children, 6)
+            peak = peaks.pop()
+            if memory:
+                peak = max(peak, tracemalloc.get_traced_memory()[1])
+                args['peak_memory'] = peak
+                if peaks:
+                    peaks[-1] = max(peaks[-1], peak)
+            if profile:
+                self._profiling = False
+                self._dump(name, profile)
+            self.record(name, ts, duration, args)
+
+    def record(self, name, ts, duration, args):
+        """Add the event of stage name, which started ts microseconds after the epoch
+        and lasted duration seconds, e.g. a stage interleaved with others on the loop
+        of the asynchronous pipeline"""
+        event = dict(name=name, cat='stage', ph='X', ts=ts, dur=round(duration * 1e6),
+                     pid=os.getpid(), tid=threading.get_ident(), args=args)
+        with self._lock:
+            self.events.append(event)
+
+    def _dump(self, name, profile):
+        self._dumps += 1
+        path = self.profile_dir / '{}-{:03d}-{}.prof'.format(os.getpid(), self._dumps, name)
+        profile.dump_stats(path)
+        logger.debug('Profile of {} written to {}'.format(name, path))
+
+    def extend(self, events):
+        """Add events recorded elsewhere, e.g. by a worker process"""
+        with self._lock:
+            self.events.extend(events)
+
+    def totals(self):
+        """Return dict mapping stage name to (count, total seconds)"""
+        totals = {}
+        for event in self.events:
+            count, seconds = totals.get(event['name'], (0, 0))
+            totals[event['name']] = (count + 1, seconds + event['dur'] / 1e6)
+        return totals
+
+    def save(self, path):
+        """Write events to path in the Chrome trace format"""
+        path = Path(path)
+        tmp = path.with_name('.' + path.name + '.tmp')
+        tmp.write_text(json.dumps(dict(traceEvents=self.events, displayTimeUnit='ms')))
+        tmp.replace(path)
+
+    def close(self):
+        """Stop tracemalloc if this tracer started it"""
+        if self._tracemalloc:
+            self._tracemalloc = False
+            tracemalloc.stop()
+
+
+def children_cpu():
+    """CPU seconds used by the reaped child processes"""
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+tracer = NullTracer()
+
+def install(new):
+    """Make new the tracer of every stage and return it. The tracer it replaces is closed"""
+    global tracer
+    if tracer is not new:
+        tracer.close()
+    tracer = new
+    return new
+
+def stage(name, **args):
+    """Context manager recording the enclosed block as stage name with the installed tracer"""
+    return tracer.stage(name, **args)
+
+def record(name, ts, duration, args):
+    """Add an event for stage name to the installed tracer"""
+    tracer.record(name, ts, duration, args)
@@ -1,45 +1,69 @@
-from tables import SubAreasFormatter, SubStatsFormatter, SiteFormatter, LotStatsFormatter, TOSFormatter
-from aux import ProjectInfo, parse_arguments, read_texts, Charlie
-from factory import BuildingFactory, SubplotFactory, SiteFactory
-from pathlib import Path
-from land import Lot
+from aux import parse_arguments
+from batch import read_manifest, run_batch, write_summary
+from project import Project, publish
+from graph import format_plan
+from watch import watch
+from stats import write_stats
+from diff import write_diff, write_snapshot
+import logging, sys, tracing
+
+logger = logging.getLogger(__name__)
 
 def main():
     args = parse_arguments()
-    root = Path(args.directory).absolute()
-    schedules = root / 'publisher' / 'schedules'
-    out = root / 'publisher' / 'unscheduler'
-    project_info = ProjectInfo(root/'config.ini')
-    texts = read_texts(schedules)
-
-    site = SiteFactory(texts['topografico.txt'], project_info)
-    buildings = BuildingFactory.get_buildings(texts, project_info.misc.files) 
-    project_info.build_relations(buildings)
-    subplots = SubplotFactory.get_subplots(texts['subplots.txt'], texts['area_perm.txt'], project_info.relations)
-    lot = Lot.from_lands(0, 'lote', subplots, **project_info.misc._asdict())
-    write_tables(site, lot, buildings, out)
-    Charlie.do(out, out)
-
-def write_tables(site, lot, buildings, out):
-    with (out / 'topografico.tex').open('w') as f:
-        f.write(SiteFormatter().format(site))
+    if args.trace or args.profile:
+        tracer = tracing.install(tracing.Tracer(args.profile))
+        try:
+            return run(args)
+        finally:
+            tracing.install(tracing.NullTracer())
+            if args.trace:
+                tracer.save(args.trace)
+            for name, (count, seconds) in sorted(tracer.totals().items()):
+                logger.info('{}: {} run(s), {:.3f}s'.format(name, count, seconds))
+    return run(args)
 
-    for building in buildings:
-        building.write_latex(out)
- 
-    with (out / 'subplot-areas.tex').open('w') as f:
-        f.write(SubAreasFormatter().format(lot))
-
-    with (out / 'suplot-stats.tex').open('w') as f:
-        f.write(SubStatsFormatter().format(lot))
-   
-    with (out / 'lot-stats.tex').open('w') as f:
-        f.write(LotStatsFormatter().format(site, lot))
-
-    with (out / 'tos.tex').open('w') as f:
-        f.write(TOSFormatter().format(lot))
+def run(args):
+    roots = list(args.directory)
+    if args.manifest:
+        roots.extend(read_manifest(args.manifest))
+    elif not roots:
+        roots = ['.']
+    if args.plan:
+        for root in roots:
+            if len(roots) > 1:
+                print('{}:'.format(root))
+            print(format_plan(Project(root).plan()), end='')
+        return 0
+    if args.format:
+        if len(roots) != 1:
+            print('Stats are written for a single project', file=sys.stderr)
+            return 2
+        write_stats(roots[0], args)
+        return 0
+    if args.snapshot or args.diff:
+        if len(roots) != 1:
+            print('Snapshots and diffs take a single project', file=sys.stderr)
+            return 2
+        if args.snapshot:
+            write_snapshot(roots[0], args)
+        return write_diff(roots[0], args) if args.diff else 0
+    if args.watch:
+        if len(roots) != 1:
+            print('Watch mode takes a single project', file=sys.stderr)
+            return 2
+        return watch(roots[0], args)
+    if len(roots) == 1 and not args.manifest:
+        failed = publish(roots[0], args)
+        if failed:
+            print('Failed to compile: {}'.format(', '.join(failed)), file=sys.stderr)
+            return 1
+        return 0
+    results = run_batch(roots, args)
+    for result in results:
+        tracing.tracer.extend(result.pop('trace', ()))
+    write_summary(results, sys.stdout, args.summary)
+    return int(any(result['status'] != 'ok' for result in results))
 
 if __name__ == '__main__':
-    main()
-
-    
+    sys.exit(main())
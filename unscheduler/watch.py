@@ -0,0 +1,98 @@
+"""
+Module disposes of watch mode, which keeps a project loaded and publishes it
+again whenever its schedules or configuration file change.
+"""
+from project import Project, get_cache, table_cache
+import asyncio, logging, pipeline, time, tracing
+
+logger = logging.getLogger(__name__)
+
+class Watcher:
+    """
+    Polls the schedules directory and configuration file of project for changes.
+    A burst of changes (e.g. Archicad exporting several schedules) is reported
+    once, after debounce seconds pass without further changes.
+    """
+    def __init__(self, project, interval=0.5, debounce=1.0):
+        self.project = project
+        self.interval = interval
+        self.debounce = debounce
+        self.state = self.snapshot()
+
+    def __repr__(self):
+        s = '{}: project={}; interval={}; debounce={};'
+        return s.format(self.__class__, self.project.root, self.interval, self.debounce)
+
+    def snapshot(self):
+        """Return dict mapping watched file names to (mtime, size)"""
+        paths = [self.project.config]
+        if self.project.schedules.is_dir():
+            paths.extend(p for p in self.project.schedules.iterdir() if '.txt' in p.name)
+        state = {}
+        for path in paths:
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            state[path.name] = (stat.st_mtime_ns, stat.st_size)
+        return state
+
+    def poll(self):
+        """Return set of names changed, created or deleted since the last poll"""
+        state = self.snapshot()
+        changed = {name for name in state.keys() | self.state.keys() if state.get(name) != self.state.get(name)}
+        self.state = state
+        return changed
+
+    def wait(self):
+        """Block until files change and stay unchanged for debounce seconds.
+        Return set of changed names"""
+        changed = set()
+        quiet_since = None
+        while True:
+            time.sleep(self.interval)
+            new = self.poll()
+            if new:
+                changed |= new
+                quiet_since = time.monotonic()
+            elif changed and time.monotonic() - quiet_since >= self.debounce:
+                return changed
+
+
+def watch(root, args):
+    """Publish project at root and publish it again on every change until interrupted.
+    Each cycle rebuilds the tables whose inputs changed, or all of them if args.all is set"""
+    cache = get_cache(args)
+    project = Project(root, table_cache(cache))
+    watcher = Watcher(project, debounce=args.debounce)
+    logger.info(repr(watcher))
+    changed = None
+    try:
+        while True:
+            try:
+                with tracing.stage('cycle', changed=sorted(changed or [])):
+                    if args.use_async:
+                        statuses = asyncio.run(pipeline.publish(project, args.jobs, cache, args.all, changed))
+                    elif changed is None or project.config.name in changed:
+                        with tracing.stage('load'):
+                            project.load()
+                    else:
+                        with tracing.stage('update'):
+                            project.update(changed)
+                    if not args.use_async:
+                        outputs = None if args.all else project.plan()
+                        statuses = project.publish(args.jobs, cache, outputs, args.combined)
+                failed = [name for name, status in statuses.items() if status]
+                print('Published {}{}'.format(project.root, '; failed: ' + ', '.join(failed) if failed else ''))
+                reload = False
+            except Exception:
+                logger.exception('Error publishing {}'.format(project.root))
+                reload = True
+            if args.trace:
+                tracing.tracer.save(args.trace)
+            changed = watcher.wait()
+            logger.info('Changed: {}'.format(', '.join(sorted(changed))))
+            if reload:
+                changed = None
+    except KeyboardInterrupt:
+        return 0